@@ -4,4 +4,15 @@ from .models import Book
 class BookSerializer(serializers.ModelSerializer):
     class Meta:
         model  = Book
-        fields = ["id", "title", "author", "pages"]
\ No newline at end of file
+        fields = ["id", "title", "author", "pages"]
+
+
+MGET_MAX_IDS = 1000
+
+class MultiGetSerializer(serializers.Serializer):
+    """Cuerpo de `POST /books/_mget`: `{"ids": [...]}`."""
+    ids = serializers.ListField(
+        child=serializers.RegexField(r"^[0-9a-f]{24}$"),  # como `_hex_id`
+        allow_empty=False,
+        max_length=MGET_MAX_IDS,
+    )
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import BookListCreate, BookRetrieve
+from .views import BookListCreate, BookMultiGet, BookRetrieve
 
 urlpatterns = [
     path("books/", BookListCreate.as_view()),
+    path("books/_mget", BookMultiGet.as_view()),  # antes que `<str:id>`
     path("books/<str:id>", BookRetrieve.as_view()),
 ]
\ No newline at end of file
@@ -2,8 +2,12 @@ from django.shortcuts import render
 
 # Create your views here.
 from rest_framework import generics
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from .models import Book
-from .serializers import BookSerializer
+from .serializers import BookSerializer, MultiGetSerializer
+
+MGET_CHUNK = 500  # ids por `IN (...)`, bajo el límite de parámetros de SQLite (999)
 
 class BookListCreate(generics.ListCreateAPIView):
     queryset = Book.objects.all()
@@ -12,4 +16,29 @@ class BookListCreate(generics.ListCreateAPIView):
 class BookRetrieve(generics.RetrieveAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
-    lookup_field = "id"
\ No newline at end of file
+    lookup_field = "id"
+
+class BookMultiGet(APIView):
+    """
+    Varios libros por ID en una petición: un `SELECT ... IN` por bloque en
+    lugar de un GET por libro. Responde un resultado por ID, en el mismo
+    orden: `{"id", "found": true, "book"}` o `{"id", "found": false}`.
+    """
+
+    def post(self, request):
+        params = MultiGetSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        ids = params.validated_data["ids"]
+        unique = list(dict.fromkeys(ids))
+        books = {}
+        for start in range(0, len(unique), MGET_CHUNK):
+            # `order_by()`: sin el ORDER BY title de `Meta.ordering`
+            chunk = Book.objects.filter(id__in=unique[start:start + MGET_CHUNK]).order_by()
+            books.update((book["id"], book) for book in BookSerializer(chunk, many=True).data)
+        docs = [
+            {"id": book_id, "found": True, "book": books[book_id]}
+            if book_id in books
+            else {"id": book_id, "found": False}
+            for book_id in ids
+        ]
+        return Response({"docs": docs})
@@ -1,8 +1,24 @@
 # basado en https://github.com/ArjanCodes/2023-fastapi/tree/main
 
 from enum import Enum
-from fastapi import FastAPI, HTTPException, Path, Query, Depends
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, Header, HTTPException, Path, Query, Depends, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter
+from pydantic_core import to_json
+
+from inventory import INT64_MAX, INT64_MIN, NAME_MAX_LENGTH, ItemRecord, create_inventory
+from inventory_concurrent import ConcurrentInventory, VersionConflict
+from inventory_feed import ChangeFeed
+from inventory_stats import Stats
+from inventory_stream import (
+    IMPORT_BATCH_DEFAULT, IMPORT_BATCH_MAX, IMPORT_OPENAPI, ImportResponse, NdjsonImporter,
+    iter_ndjson,
+)
+from inventory_cache import VersionedResponse
+from inventory_batch import (
+    BATCH_OPENAPI, BatchParser, BatchResponse, apply_batch, batch_payload,
+)
 
 app = FastAPI(
     title="Basic FastAPI App",
@@ -21,34 +37,98 @@ class Category(Enum):
 class Item(BaseModel):
     """Representation of an item in the system."""
 
-    name: str = Field(description="Name of the item.")
-    price: float = Field(description="Price of the item in Euro.")
-    count: int = Field(description="Amount of instances of this item in stock.")
-    id: int = Field(description="Unique integer that specifies this item.")
+    name: str = Field(max_length=NAME_MAX_LENGTH, description="Name of the item.")
+    price: float = Field(allow_inf_nan=False, description="Price of the item in Euro.")
+    count: int = Field(
+        ge=INT64_MIN, le=INT64_MAX, description="Amount of instances of this item in stock."
+    )
+    id: int = Field(
+        ge=INT64_MIN, le=INT64_MAX, description="Unique integer that specifies this item."
+    )
     category: Category = Field(description="Category this item belongs to.")
 
 
+# The default 422 handler echoes the invalid input back as JSON; a NaN or
+# infinite price cannot be encoded that way, so the 422 itself became a 500.
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError) -> Response:
+    body = to_json({"detail": exc.errors()}, inf_nan_mode="strings", fallback=str)
+    return Response(body, status_code=422, media_type="application/json")
+
+
 # Sample data to simulate a database.
 # In a real application, you would typically fetch this data from a database.
-items = {
-    0: Item(name="Hammer", price=9.99, count=20, id=0, category=Category.TOOLS),
-    1: Item(name="Pliers", price=5.99, count=20, id=1, category=Category.TOOLS),
-    2: Item(name="Nails", price=1.99, count=100, id=2, category=Category.CONSUMABLES),
-}
+# Same store as basic_app.py; see the notes there.
+items: ConcurrentInventory[ItemRecord] = ConcurrentInventory(create_inventory(
+    [
+        ItemRecord(name="Hammer", price=9.99, count=20, id=0, category=Category.TOOLS),
+        ItemRecord(name="Pliers", price=5.99, count=20, id=1, category=Category.TOOLS),
+        ItemRecord(name="Nails", price=1.99, count=100, id=2, category=Category.CONSUMABLES),
+    ],
+    factory=ItemRecord,
+    category_type=Category,
+), feed=ChangeFeed())
 
 
 # FastAPI handles JSON serialization and deserialization for us.
 # We can simply use built-in python and Pydantic types, in this case dict[int, Item].
-@app.get("/")
-def index() -> dict[str, dict[int, Item]]:
-    return {"items": items}
+# `GET /` serializes the whole inventory: encode it once per store version
+# and serve the cached bytes (with ETag / gzip) until the next write.
+# Records are encoded straight to JSON (no Item validation); the Item-based
+# `Index` type only documents the response.
+Index = dict[str, dict[int, Item]]
+_index_json = TypeAdapter(dict[str, dict[int, ItemRecord]]).dump_json
+index_response = VersionedResponse(items, lambda: _index_json({"items": dict(items.items())}))
+
+
+@app.get("/", response_model=Index)
+def index(request: Request) -> Response:
+    return index_response.response(request)
+
+
+# Declared before /items/{item_id}, which would otherwise match "stats".
+# The aggregates are kept up to date by every write, so this reads a few
+# numbers per category instead of scanning the inventory.
+@app.get("/items/stats")
+def item_stats() -> dict[Category, Stats]:
+    """Per category: items, units, stock value (price × count), min/max price."""
+    return items.stats()
+
+
+@app.get("/items/export")
+def export_items() -> StreamingResponse:
+    """The whole inventory as NDJSON (one item per line), streamed in chunks."""
+    return StreamingResponse(iter_ndjson(items), media_type="application/x-ndjson")
+
+
+@app.get("/items/changes", response_class=StreamingResponse)
+async def item_changes(
+    since: int | None = Query(None, ge=0, description="Resume after this sequence number."),
+    last_event_id: str | None = Header(None),
+) -> StreamingResponse:
+    """
+    Server-Sent Events for every added, updated or deleted item, each with a
+    sequence number, instead of polling GET /. Reconnecting with
+    Last-Event-ID (or ?since=) resumes from the in-memory ring buffer; if the
+    events are gone, an `event: reset` says to reload GET / first.
+    """
+    start = items.feed.resume_point(last_event_id, since)
+    return StreamingResponse(
+        items.feed.stream(start),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/items/{item_id}")
-def get_item(item_id: int) -> Item:
-    if item_id not in items:
+def get_item(item_id: int, response: Response) -> Item:
+    try:
+        item, version = items.versioned(item_id)
+    except KeyError:
         raise HTTPException(status_code = 404, detail = f"Item with id {item_id} not found")
-    return items[item_id]
+    # Send it back in If-Match to update only if nobody changed the item since
+    response.headers["ETag"] = items.etag(version)
+    return item
 
 
 
@@ -69,21 +149,24 @@ class ItemFilter(BaseModel):
     price:    float    | None = Field(None, gt=0, description="Precio exacto")
     count:    int      | None = Field(None, ge=0, description="Cantidad exacta")
     category: Category | None = None
+    price_min: float   | None = Field(None, ge=0, description="Precio mínimo (incluido)")
+    price_max: float   | None = Field(None, ge=0, description="Precio máximo (incluido)")
 
 
 # Alias de tipo opcional para la respuesta (solo para hacerla explícita)
 Selection = dict[str, str | int | float | Category | None]
+_query_json = TypeAdapter(dict[str, Selection | list[ItemRecord]]).dump_json
 
 # ---------------------------------------------------------------------------
 #  ENDPOINT: /items/
 # ---------------------------------------------------------------------------
 
-@app.get("/items/")
+@app.get("/items/", response_model=dict[str, Selection | list[Item]])
 def query_items(
     # FastAPI “inyecta” la instancia ItemFilter usando Depends()
     # Los argumentos de la URL (?name=..., ?price=...) se parsean y validan aquí.
     filter: Annotated[ItemFilter, Depends()]
-) -> dict[str, Selection | list[Item]]:
+) -> Response:
     """
     Busca artículos que cumplan TODOS los filtros proporcionados.
     Devuelve:
@@ -91,34 +174,28 @@ def query_items(
         - 'selection' → lista de Item coincidentes
     """
 
-    # --- función interna de coincidencia ---
-    def match(item: Item) -> bool:
-        """
-        Devuelve True si el item coincide con CADA campo que el
-        usuario haya incluido en la consulta.
-        Se usan solo los campos presentes en filter.model_fields_set.
-        """
-        return all(
-            getattr(item, field) == getattr(filter, field)
-            for field in filter.model_fields_set
-        )
-
-    # Filtrar la “base de datos”
-    selection = [i for i in items.values() if match(i)]
+    # Filtrar la “base de datos” con sus índices: cada filtro aporta un
+    # conjunto de candidatos y se intersectan empezando por el más pequeño,
+    # en lugar de comparar campo a campo todos los artículos.
+    selection = items.query(**filter.model_dump(exclude_none=True))
 
-    # Respuesta con metadatos
-    return {
+    # Respuesta con metadatos, serializada directamente desde los registros
+    # (sin validar cada coincidencia contra `Item`)
+    return Response(_query_json({
         "query":     filter.model_dump(exclude_none=True),  # parámetros reales
         "selection": selection,                             # coincidencias
-    }
+    }), media_type="application/json")
 
 @app.post("/")
 def add_item(item: Item) -> dict[str, Item]:
 
     if item.id in items:
-        HTTPException(status_code=400, detail=f"Item with {item.id=} already exists.")
+        raise HTTPException(status_code=400, detail=f"Item with {item.id=} already exists.")
 
-    items[item.id] = item
+    try:
+        items.add(ItemRecord.of(item))
+    except KeyError:  # added by a concurrent request
+        raise HTTPException(status_code=400, detail=f"Item with {item.id=} already exists.")
     return {"added": item}
 
 
@@ -141,6 +218,7 @@ def update(
         description="New price of the item in Euro.",
         default=None,
         gt=0.0,
+        allow_inf_nan=False,
     ),
     count: int
     | None = Query(
@@ -148,33 +226,109 @@ def update(
         description="New amount of instances of this item in stock.",
         default=None,
         ge=0,
+        le=INT64_MAX,
+    ),
+    if_match: str
+    | None = Header(
+        title="If-Match",
+        description="ETag from GET /items/{item_id}: update only if the item is unchanged.",
+        default=None,
     ),
 ):
     if item_id not in items:
-        HTTPException(status_code=404, detail=f"Item with {item_id=} does not exist.")
+        raise HTTPException(status_code=404, detail=f"Item with {item_id=} does not exist.")
     if all(info is None for info in (name, price, count)):
         raise HTTPException(
             status_code=400, detail="No parameters provided for update."
         )
 
-    item = items[item_id]
-    if name is not None:
-        item.name = name
-    if price is not None:
-        item.price = price
-    if count is not None:
-        item.count = count
-
+    changes = {"name": name, "price": price, "count": count}
+    try:
+        item = items.update(
+            item_id,
+            if_version=items.if_match_versions(if_match),
+            **{field: value for field, value in changes.items() if value is not None},
+        )
+    except KeyError:  # deleted by a concurrent request
+        raise HTTPException(status_code=404, detail=f"Item with {item_id=} does not exist.")
+    except VersionConflict:
+        raise HTTPException(
+            status_code=412, detail=f"Item with {item_id=} was modified (If-Match)."
+        )
     return {"updated": item}
 
 
 @app.delete("/items/{item_id}")
-def delete_item(item_id: int) -> dict[str, Item]:
+def delete_item(
+    item_id: int,
+    if_match: str | None = Header(
+        title="If-Match",
+        description="ETag from GET /items/{item_id}: delete only if the item is unchanged.",
+        default=None,
+    ),
+) -> dict[str, Item]:
 
     if item_id not in items:
         raise HTTPException(
             status_code=404, detail=f"Item with {item_id=} does not exist."
         )
 
-    item = items.pop(item_id)
-    return {"deleted": item}
\ No newline at end of file
+    try:
+        item = items.remove(item_id, if_version=items.if_match_versions(if_match))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Item with {item_id=} does not exist.")
+    except VersionConflict:
+        raise HTTPException(
+            status_code=412, detail=f"Item with {item_id=} was modified (If-Match)."
+        )
+    return {"deleted": item}
+
+
+# ---------------------------------------------------------------------------
+#  ENDPOINT: /items/batch (muchos cambios en una petición)
+# ---------------------------------------------------------------------------
+
+batch_parser = BatchParser(Item)
+
+
+@app.post(
+    "/items/batch",
+    response_model=BatchResponse,
+    response_model_exclude_none=True,
+    openapi_extra=BATCH_OPENAPI,
+)
+def batch_items(
+    payload: Annotated[list[bytes | object], Depends(batch_payload)],
+    atomic: bool = False,
+) -> BatchResponse:
+    """
+    Upserts, patches y deletes en un array JSON o NDJSON (ver
+    `inventory_batch.py`), aplicados en una pasada con un resultado por
+    elemento. Con `atomic=true`, o se aplican todos o ninguno.
+    """
+    changes, results = batch_parser.parse(payload, items)
+    return apply_batch(items, changes, results, atomic)
+
+
+# ---------------------------------------------------------------------------
+#  ENDPOINT: /items/import (NDJSON en streaming)
+# ---------------------------------------------------------------------------
+
+importer = NdjsonImporter(Item)
+
+
+@app.post(
+    "/items/import",
+    response_model=ImportResponse,
+    response_model_exclude_defaults=True,
+    openapi_extra=IMPORT_OPENAPI,
+)
+async def import_items(
+    request: Request,
+    batch_size: Annotated[int, Query(ge=1, le=IMPORT_BATCH_MAX)] = IMPORT_BATCH_DEFAULT,
+) -> ImportResponse:
+    """
+    Upsert de un `Item` por línea NDJSON. El cuerpo se procesa según llega,
+    en lotes de `batch_size` líneas: no se guarda entero en memoria.
+    """
+    return await importer.run(request, items, batch_size)
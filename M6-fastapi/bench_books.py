@@ -0,0 +1,628 @@
+"""
+Benchmarks del servicio de libros (`fastapi_sqlalchemy.py`)
+============================================================
+
+Cada subcomando levanta el servicio con `uvicorn` en un subproceso contra una
+BD SQLite temporal y lo bombardea con peticiones concurrentes usando
+`httpx.AsyncClient`.
+
+    python bench_books.py async --requests 5000 --concurrency 500
+    python bench_books.py herd --clients 500 --rounds 20
+    python bench_books.py projection --sizes 10000 100000 1000000
+    python bench_books.py explain      # comprueba que cada filtro usa un índice
+    python bench_books.py startup      # import en frío -> primera respuesta
+    python bench_books.py metrics      # coste de la instrumentación
+    python bench_books.py replicas     # reparto entre réplicas y read-your-writes
+    python bench_books.py mget         # POST /books/_mget frente a N GET /books/{id}
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import httpx
+
+HERE = Path(__file__).resolve().parent
+
+
+# --------------------------------------------------------------------------- #
+#               Utilidades                                                    #
+# --------------------------------------------------------------------------- #
+
+def seed_sqlite(path: Path, rows: int) -> list[str]:
+    """Crea la tabla `books` en un fichero SQLite y la puebla con `rows` libros."""
+    ids = [secrets.token_hex(12) for _ in range(rows)]
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS books ("
+            " id VARCHAR(24) PRIMARY KEY, title VARCHAR(255) NOT NULL,"
+            " author VARCHAR(255) NOT NULL, pages INTEGER NOT NULL)"
+        )
+        for column in ("author", "title", "pages"):  # como `Book.__table_args__`
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_books_{column}_id ON books ({column}, id)"
+            )
+        conn.executemany(
+            "INSERT INTO books VALUES (?, ?, ?, ?)",
+            ((id_, f"Book {i}", f"Author {i % 100}", i % 1000) for i, id_ in enumerate(ids)),
+        )
+    return ids
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def run_server(env: dict[str, str], workers: int = 1) -> Iterator[str]:
+    """Arranca `uvicorn fastapi_sqlalchemy:app` y devuelve su URL base."""
+    port = free_port()
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "fastapi_sqlalchemy:app",
+            "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+        ],
+        cwd=HERE,
+        env={**os.environ, **env},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{base_url}/docs", timeout=1)
+                break
+            except httpx.TransportError:
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("El servidor no ha arrancado")
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+async def hammer(base_url: str, paths: list[str], concurrency: int) -> dict[str, float]:
+    """Lanza `len(paths)` GETs con `concurrency` en vuelo; devuelve métricas."""
+    latencies: list[float] = []
+    queue = iter(paths)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+
+        async def worker() -> None:
+            for path in queue:
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "req/s": len(latencies) / elapsed,
+        "p50 ms": statistics.median(latencies) * 1000,
+        "p99 ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def run_child(command: list[str], env: dict[str, str]) -> dict[str, float]:
+    """Ejecuta un subcomando interno en un proceso nuevo (el servicio lee su
+    configuración del entorno al importarse) y devuelve el JSON que imprime."""
+    out = subprocess.run(
+        [sys.executable, __file__, *command],
+        cwd=HERE,
+        env={**os.environ, **env},
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def print_table(rows: dict[str, dict[str, float]]) -> None:
+    columns = list(next(iter(rows.values())))
+    print(f"{'':>12}" + "".join(f"{c:>12}" for c in columns))
+    for name, metrics in rows.items():
+        print(f"{name:>12}" + "".join(f"{metrics[c]:>12.1f}" for c in columns))
+
+
+# --------------------------------------------------------------------------- #
+#               Subcomandos                                                   #
+# --------------------------------------------------------------------------- #
+
+def bench_async(args: argparse.Namespace) -> None:
+    """Ruta síncrona (threadpool) frente a ruta asíncrona con alta concurrencia."""
+    # Mismo pool para ambos modos, dimensionado para las peticiones en vuelo
+    pool = {"DB_POOL_SIZE": str(args.concurrency), "DB_MAX_OVERFLOW": "10"}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        ids = seed_sqlite(db_path, args.rows)
+        paths = [f"/books/{ids[i % len(ids)]}" for i in range(args.requests)]
+        modes = {
+            "sync": {
+                **pool,
+                "DATABASE_URL": f"sqlite:///{db_path}",
+                "BOOKS_ASYNC_DB": "0",
+            },
+            "async": {
+                **pool,
+                "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{db_path}",
+                "BOOKS_ASYNC_DB": "1",
+            },
+        }
+        results = {}
+        for name, env in modes.items():
+            with run_server(env) as base_url:
+                asyncio.run(hammer(base_url, paths[:100], 10))  # calentamiento
+                results[name] = asyncio.run(hammer(base_url, paths, args.concurrency))
+    print_table(results)
+
+
+def bench_herd(args: argparse.Namespace) -> None:
+    """Avalancha de peticiones al mismo libro con y sin single-flight."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        book_id = seed_sqlite(db_path, 1_000)[0]
+        results = {}
+        for mode in ("sync", "async"):
+            for flight in ("off", "on"):
+                env = {
+                    "DATABASE_URL": f"sqlite:///{db_path}",
+                    "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{db_path}",
+                    "BOOKS_ASYNC_DB": "1" if mode == "async" else "0",
+                    "BOOKS_SINGLEFLIGHT": "1" if flight == "on" else "0",
+                    "DB_POOL_SIZE": str(args.clients),
+                }
+                command = ["_herd", book_id, str(args.clients), str(args.rounds)]
+                results[f"{mode}/{flight}"] = run_child(command, env)
+    print_table(results)
+
+
+def herd_child(args: argparse.Namespace) -> None:
+    """Proceso hijo de `herd`: importa el servicio ya configurado y lo mide."""
+    from sqlalchemy import event
+
+    import fastapi_sqlalchemy as books
+
+    pool = {"checked_out": 0, "peak": 0, "selects": 0}
+
+    def on_checkout(*_):
+        pool["checked_out"] += 1
+        pool["peak"] = max(pool["peak"], pool["checked_out"])
+
+    def on_checkin(*_):
+        pool["checked_out"] -= 1
+
+    def on_execute(*_):
+        pool["selects"] += 1
+
+    async def run() -> float:
+        async with books.app.router.lifespan_context(books.app):
+            # Los motores existen a partir del arranque de la app
+            engine = books.async_engine.sync_engine if books.USE_ASYNC_DB else books.engine
+            event.listen(engine, "checkout", on_checkout)
+            event.listen(engine, "checkin", on_checkin)
+            event.listen(engine, "before_cursor_execute", on_execute)
+            transport = httpx.ASGITransport(app=books.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                start = time.perf_counter()
+                for _ in range(args.rounds):
+                    books.book_cache.clear()  # la entrada caduca -> avalancha
+                    responses = await asyncio.gather(
+                        *(client.get(f"/books/{args.book_id}") for _ in range(args.clients))
+                    )
+                    assert all(r.status_code == 200 for r in responses)
+                return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    flights = books.book_flights_async if books.USE_ASYNC_DB else books.book_flights
+    print(json.dumps({
+        "req/s": args.clients * args.rounds / elapsed,
+        "SELECTs": pool["selects"],
+        "saved": flights.stats.shared,
+        "peak conns": pool["peak"],
+    }))
+
+
+def bench_projection(args: argparse.Namespace) -> None:
+    """Filas/s del listado: ORM + Pydantic frente a proyección de columnas."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        seed_sqlite(db_path, max(args.sizes))
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+        from pydantic import TypeAdapter
+        from sqlalchemy import select
+
+        import fastapi_sqlalchemy as books
+
+        books.configure_db()
+        adapter = TypeAdapter(list[books.BookResponse])
+
+        def orm_path(n: int) -> bytes:
+            # Lo que hacía `list_books`: instancias ORM en el identity map,
+            # validación `from_attributes` por objeto y serialización.
+            with books.SessionLocal() as db:
+                rows = db.scalars(select(books.Book).order_by(books.Book.id).limit(n)).all()
+                return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+        def projection_path(n: int) -> bytes:
+            with books.SessionLocal() as db:
+                return books.rows_json(books.keyset_page(db, books.BookFilter(), None, n))
+
+        results = {}
+        for n in args.sizes:
+            timings = {}
+            for name, fn in (("orm", orm_path), ("projection", projection_path)):
+                start = time.perf_counter()
+                body = fn(n)
+                timings[name] = time.perf_counter() - start
+                timings[name + " body"] = body
+            assert timings["orm body"] == timings["projection body"], "bytes distintos"
+            results[f"{n:,}"] = {
+                "orm rows/s": n / timings["orm"],
+                "proj rows/s": n / timings["projection"],
+                "speed-up": timings["orm"] / timings["projection"],
+            }
+    print_table(results)
+
+
+def check_explain(args: argparse.Namespace) -> None:
+    """EXPLAIN QUERY PLAN de cada filtro: debe buscar por índice, no recorrer la tabla."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        seed_sqlite(db_path, args.rows)
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+        import fastapi_sqlalchemy as books
+
+        books.configure_db()
+        cases = {
+            "author": {"author": "Author 7"},
+            "title_prefix": {"title_prefix": "Book 12"},
+            "min_pages": {"min_pages": 990},
+            "max_pages": {"max_pages": 5},
+            "min+max_pages": {"min_pages": 100, "max_pages": 120},
+            "author+cursor": {"author": "Author 7", "_after": ("Author 7", "8" * 24)},
+        }
+        failures = []
+        with books.engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+            for name, params in cases.items():
+                cursor = params.pop("_after", None)
+                stmt = books.keyset_stmt(books.BookFilter(**params), cursor, 100)
+                sql = stmt.compile(conn.engine, compile_kwargs={"literal_binds": True})
+                plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+                ok = any("USING INDEX ix_books_" in step for step in plan) and not any(
+                    step.startswith("SCAN books") for step in plan
+                )
+                print(f"{'OK ' if ok else 'FAIL'} {name:>14}: {' | '.join(plan)}")
+                if not ok:
+                    failures.append(name)
+    if failures:
+        sys.exit(f"Sin índice: {', '.join(failures)}")
+
+
+STARTUP_CHILD = """
+import time
+t0 = time.perf_counter()
+import asyncio, json, httpx
+import fastapi_sqlalchemy as books
+t1 = time.perf_counter()
+
+async def main():
+    async with books.app.router.lifespan_context(books.app):
+        t2 = time.perf_counter()
+        transport = httpx.ASGITransport(app=books.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            (await c.get("/books/?limit=1")).raise_for_status()
+        return t2, time.perf_counter()
+
+t2, t3 = asyncio.run(main())
+print(json.dumps({
+    "import ms": (t1 - t0) * 1000,
+    "startup ms": (t2 - t1) * 1000,
+    "1st req ms": (t3 - t2) * 1000,
+}))
+"""
+
+
+def bench_startup(args: argparse.Namespace) -> None:
+    """Import en frío hasta la primera respuesta, con y sin comprobar el esquema."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        seed_sqlite(db_path, 1_000)
+        results = {}
+        for skip in ("0", "1"):
+            env = {
+                **os.environ,
+                "DATABASE_URL": f"sqlite:///{db_path}",
+                "DB_SKIP_SCHEMA_CHECK": skip,
+            }
+            runs = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                out = subprocess.run(
+                    [sys.executable, "-c", STARTUP_CHILD],
+                    cwd=HERE, env=env, check=True, capture_output=True, text=True,
+                ).stdout
+                runs.append({
+                    **json.loads(out.splitlines()[-1]),
+                    "process ms": (time.perf_counter() - start) * 1000,
+                })
+            name = "skip schema" if skip == "1" else "create_all"
+            results[name] = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+    print_table(results)
+
+
+def bench_metrics(args: argparse.Namespace) -> None:
+    """Coste por petición de la instrumentación (`BOOKS_METRICS=1` frente a 0)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        ids = seed_sqlite(db_path, 1_000)
+        results = {}
+        for enabled in ("0", "1"):
+            env = {
+                "DATABASE_URL": f"sqlite:///{db_path}",
+                "BOOKS_METRICS": enabled,
+                "BOOK_CACHE_SIZE": "0",  # que cada petición llegue a la BD
+            }
+            runs = [
+                run_child(["_requests", ids[0], str(args.requests)], env)
+                for _ in range(args.runs)
+            ]
+            name = "metrics on" if enabled == "1" else "metrics off"
+            results[name] = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+    off, on = results["metrics off"], results["metrics on"]
+    results["overhead %"] = {key: (on[key] / off[key] - 1) * 100 for key in on}
+    print_table(results)
+
+
+def requests_child(args: argparse.Namespace) -> None:
+    """Proceso hijo de `metrics`: µs por petición de un GET por id y un listado."""
+    import fastapi_sqlalchemy as books
+
+    async def timed(client: httpx.AsyncClient, path: str) -> float:
+        for _ in range(50):  # calentamiento
+            await client.get(path)
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            (await client.get(path)).raise_for_status()
+        return (time.perf_counter() - start) / args.requests * 1e6
+
+    async def run() -> dict[str, float]:
+        async with books.app.router.lifespan_context(books.app):
+            transport = httpx.ASGITransport(app=books.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return {
+                    "get µs": await timed(client, f"/books/{args.book_id}"),
+                    "list µs": await timed(client, "/books/?limit=20"),
+                }
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def check_replicas(args: argparse.Namespace) -> None:
+    """
+    Reparto de lecturas entre réplicas y read-your-writes, con un fichero
+    SQLite por nodo. Las "réplicas" son copias que nunca se actualizan: un
+    libro recién creado solo existe en el primario, así que verlo demuestra
+    que la lectura fue allí.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        primary = Path(tmp) / "primary.db"
+        seed_sqlite(primary, args.requests)
+        replicas = [Path(tmp) / f"replica{i}.db" for i in (1, 2)]
+        for replica in replicas:
+            shutil.copy(primary, replica)
+        results = {}
+        for mode in ("sync", "async"):
+            for policy in ("round_robin", "least_connections"):
+                env = {
+                    "DATABASE_URL": f"sqlite:///{primary}",
+                    "DATABASE_REPLICA_URLS": ",".join(f"sqlite:///{r}" for r in replicas),
+                    "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{primary}",
+                    "ASYNC_DATABASE_REPLICA_URLS": ",".join(
+                        f"sqlite+aiosqlite:///{r}" for r in replicas
+                    ),
+                    "BOOKS_ASYNC_DB": "1" if mode == "async" else "0",
+                    "DB_REPLICA_POLICY": policy,
+                    "DB_READ_YOUR_WRITES": "1",
+                    "BOOK_CACHE_SIZE": "0",  # que cada lectura llegue a la BD
+                    "DB_POOL_SIZE": str(args.requests),  # todas a la vez
+                }
+                # Los ids se leen de una réplica: el primario acumula los
+                # libros creados por las pasadas anteriores
+                result = run_child(["_replicas", str(replicas[0])], env)
+                assert result["primary"] == 0, "lecturas sin anclar en el primario"
+                assert result["replica1"] + result["replica2"] == args.requests
+                if policy == "round_robin":
+                    assert result["replica1"] == result["replica2"]
+                results[f"{mode}/{policy[:5]}"] = result
+    print_table(results)
+    print("OK: lecturas en réplicas; tras escribir, el cliente lee del primario")
+
+
+def replicas_child(args: argparse.Namespace) -> None:
+    """Proceso hijo de `replicas`: cuenta lecturas por nodo y prueba el anclaje."""
+    from sqlalchemy import event
+
+    import fastapi_sqlalchemy as books
+
+    with sqlite3.connect(args.db_path) as conn:
+        ids = [row[0] for row in conn.execute("SELECT id FROM books")]
+
+    async def run() -> dict[str, int]:
+        async with books.app.router.lifespan_context(books.app):
+            selects = {}
+            names = ("primary", "replica1", "replica2")
+            for name, engine in zip(names, books.db_router.engines):
+                selects[name] = 0
+                engine = getattr(engine, "sync_engine", engine)
+                event.listen(
+                    engine, "before_cursor_execute",
+                    lambda *a, name=name: selects.__setitem__(name, selects[name] + 1),
+                )
+
+            transport = httpx.ASGITransport(app=books.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                responses = await asyncio.gather(
+                    *(client.get(f"/books/{book_id}") for book_id in ids)
+                )
+                assert all(r.status_code == 200 for r in responses)
+                reads = dict(selects)
+
+                # Escritura: la respuesta ancla al cliente al primario
+                created = await client.post(
+                    "/books/", json={"title": "Nuevo", "author": "Yo", "pages": 1}
+                )
+                book_id = created.json()["id"]
+                assert books.PIN_COOKIE in created.cookies
+                assert (await client.get(f"/books/{book_id}")).status_code == 200
+                listed = await client.get("/books/", params={"author": "Yo"})
+                assert book_id in [b["id"] for b in listed.json()]
+
+                # Otro cliente (sin cookie) lee de una réplica, que no lo tiene
+                async with httpx.AsyncClient(
+                    transport=transport, base_url="http://test"
+                ) as other:
+                    assert (await other.get(f"/books/{book_id}")).status_code == 404
+
+                # Pasada la ventana, el mismo cliente vuelve a las réplicas
+                await asyncio.sleep(books.READ_YOUR_WRITES_SECONDS + 0.1)
+                client.cookies.set(books.PIN_COOKIE, created.cookies[books.PIN_COOKIE])
+                assert (await client.get(f"/books/{book_id}")).status_code == 404
+        return reads
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def bench_mget(args: argparse.Namespace) -> None:
+    """N ids: un `POST /books/_mget` frente a N `GET /books/{id}`, con y sin caché."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        ids = seed_sqlite(db_path, args.rows)
+        results = {}
+        for cache in ("off", "on"):
+            env = {
+                "DATABASE_URL": f"sqlite:///{db_path}",
+                "BOOK_CACHE_SIZE": "0" if cache == "off" else str(args.rows),
+            }
+            with run_server(env) as base_url, httpx.Client(base_url=base_url) as client:
+                for n in args.sizes:
+                    batch = ids[:n]
+                    body = {"ids": batch + ["0" * 24]}  # con un id inexistente
+
+                    def singles() -> list:
+                        return [client.get(f"/books/{book_id}").json() for book_id in batch]
+
+                    def mget() -> list:
+                        response = client.post("/books/_mget", json=body)
+                        response.raise_for_status()
+                        return response.json()["docs"]
+
+                    docs = mget()  # calienta la caché (si la hay) y comprueba
+                    assert docs[:-1] == [
+                        {"id": book["id"], "found": True, "book": book} for book in singles()
+                    ]
+                    assert docs[-1] == {"id": "0" * 24, "found": False}
+                    times = {}
+                    for name, call in (("N GETs", singles), ("_mget", mget)):
+                        runs = []
+                        for _ in range(args.repeat):
+                            start = time.perf_counter()
+                            call()
+                            runs.append((time.perf_counter() - start) * 1000)
+                        times[f"{name} ms"] = statistics.median(runs)
+                    times["x"] = times["N GETs ms"] / times["_mget ms"]
+                    results[f"{n} / {cache}"] = times
+    print(f"ids / caché; mediana de {args.repeat} rondas, peticiones secuenciales")
+    print_table(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("async", help=bench_async.__doc__)
+    p.add_argument("--rows", type=int, default=10_000)
+    p.add_argument("--requests", type=int, default=5_000)
+    p.add_argument("--concurrency", type=int, default=500)
+    p.set_defaults(func=bench_async)
+
+    p = sub.add_parser("herd", help=bench_herd.__doc__)
+    p.add_argument("--clients", type=int, default=500)
+    p.add_argument("--rounds", type=int, default=20)
+    p.set_defaults(func=bench_herd)
+
+    p = sub.add_parser("projection", help=bench_projection.__doc__)
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p.set_defaults(func=bench_projection)
+
+    p = sub.add_parser("explain", help=check_explain.__doc__)
+    p.add_argument("--rows", type=int, default=100_000)
+    p.set_defaults(func=check_explain)
+
+    p = sub.add_parser("startup", help=bench_startup.__doc__)
+    p.add_argument("--runs", type=int, default=5)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("metrics", help=bench_metrics.__doc__)
+    p.add_argument("--requests", type=int, default=2_000)
+    p.add_argument("--runs", type=int, default=3)
+    p.set_defaults(func=bench_metrics)
+
+    p = sub.add_parser("replicas", help=check_replicas.__doc__)
+    p.add_argument("--requests", type=int, default=200)
+    p.set_defaults(func=check_replicas)
+
+    p = sub.add_parser("mget", help=bench_mget.__doc__)
+    p.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200])
+    p.add_argument("--rows", type=int, default=10_000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_mget)
+
+    p = sub.add_parser("_replicas")
+    p.add_argument("db_path")
+    p.set_defaults(func=replicas_child)
+
+    p = sub.add_parser("_requests")
+    p.add_argument("book_id")
+    p.add_argument("requests", type=int)
+    p.set_defaults(func=requests_child)
+
+    p = sub.add_parser("_herd")
+    p.add_argument("book_id")
+    p.add_argument("clients", type=int)
+    p.add_argument("rounds", type=int)
+    p.set_defaults(func=herd_child)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1093 @@
+"""
+Benchmarks del inventario en memoria (`basic_app.py` / `inventory.py`)
+=======================================================================
+
+Cada subcomando genera un inventario sintético con `Item` de `basic_app.py`.
+
+    python bench_inventory.py query --items 1000000   # barrido lineal vs índices
+    python bench_inventory.py columnar                # dict de Item vs NumPy
+    python bench_inventory.py records                 # Item vs ItemRecord: memoria, JSON
+    python bench_inventory.py recovery                # arranque: snapshot + log
+    python bench_inventory.py fsync                   # coste de cada política
+    python bench_inventory.py index --items 100000    # `GET /` cacheado / ETag
+    python bench_inventory.py threads                 # actualizaciones perdidas, ops/s
+    python bench_inventory.py batch --ops 20000       # lotes frente a un artículo
+    python bench_inventory.py stats                   # agregados mantenidos vs recálculo
+    python bench_inventory.py ndjson --items 5000000  # export/import: ritmo y RSS
+    python bench_inventory.py feed --subscribers 1000 # SSE: reparto y escritores
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import gzip
+import json
+import math
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable, Iterable, Iterator
+
+from pydantic import TypeAdapter
+
+from basic_app import Category, Item
+from inventory import memory_inventory
+from inventory import RECORDS_JSON, Inventory, InventoryStore, ItemRecord, create_inventory
+from inventory_concurrent import Change, ConcurrentInventory, VersionConflict
+from inventory_feed import ChangeFeed
+from inventory_stats import recompute
+from inventory_durable import DurableInventory
+
+
+# --------------------------------------------------------------------------- #
+#               Utilidades                                                    #
+# --------------------------------------------------------------------------- #
+
+def iter_items(n: int, seed: int = 0) -> Iterator[Item]:
+    """`n` artículos con ~n/100 nombres distintos, precios de 0.50 a 500.00."""
+    rng = random.Random(seed)
+    categories = list(Category)
+    names = max(1, n // 100)
+    for i in range(n):
+        yield Item(
+            name=f"item-{rng.randrange(names)}",
+            price=rng.randrange(50, 50_000) / 100,
+            count=rng.randrange(1_000),
+            id=i,
+            category=rng.choice(categories),
+        )
+
+
+def make_items(n: int, seed: int = 0) -> list[Item]:
+    return list(iter_items(n, seed))
+
+
+def retained_bytes(build: Callable[[], object]) -> tuple[object, int]:
+    """Construye un objeto y mide con `tracemalloc` la memoria que retiene."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        obj = build()
+        gc.collect()
+        return obj, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def linear_query(items: Iterable[Item], **filters) -> list[Item]:
+    """El `query_items` original: comparar cada filtro con cada artículo."""
+    low, high = filters.pop("price_min", None), filters.pop("price_max", None)
+
+    def match(item: Item) -> bool:
+        return (
+            all(getattr(item, field) == value for field, value in filters.items())
+            and (low is None or item.price >= low)
+            and (high is None or item.price <= high)
+        )
+
+    return [item for item in items if match(item)]
+
+
+def timed(fn: Callable[[], object], repeat: int) -> tuple[float, object]:
+    """Mediana en ms de `repeat` ejecuciones y el último resultado."""
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+
+
+def print_table(rows: dict[str, dict[str, float]]) -> None:
+    columns = {c: max(12, len(c) + 2) for c in next(iter(rows.values()))}
+    width = max(len(name) for name in rows) + 2
+    print(f"{'':>{width}}" + "".join(f"{c:>{w}}" for c, w in columns.items()))
+    for name, metrics in rows.items():
+        print(f"{name:>{width}}" + "".join(f"{metrics[c]:>{w}.2f}" for c, w in columns.items()))
+
+
+# --------------------------------------------------------------------------- #
+#               Subcomandos                                                   #
+# --------------------------------------------------------------------------- #
+
+QUERIES = {
+    "name": {"name": "item-42"},
+    "category+count": {"category": Category.TOOLS, "count": 7},
+    "price range": {"price_min": 100.0, "price_max": 100.5},
+    "category+price": {"category": Category.CONSUMABLES, "price_min": 10.0, "price_max": 12.0},
+    "name+category": {"name": "item-7", "category": Category.TOOLS},
+    "wide price": {"price_min": 1.0, "price_max": 400.0, "count": 3},
+}
+
+
+def bench_query(args: argparse.Namespace) -> None:
+    """`query_items`: barrido lineal frente a índices secundarios."""
+    items = make_items(args.items)
+    start = time.perf_counter()
+    inventory = Inventory(items)
+    print(f"{args.items:,} artículos; índices construidos en "
+          f"{time.perf_counter() - start:.2f} s\n")
+
+    results = {}
+    for name, filters in QUERIES.items():
+        scan_ms, expected = timed(lambda: linear_query(items, **filters), args.repeat)
+        index_ms, found = timed(lambda: inventory.query(**filters), args.repeat)
+        assert [i.id for i in found] == sorted(i.id for i in expected), name
+        results[name] = {
+            "matches": len(found),
+            "scan ms": scan_ms,
+            "index ms": index_ms,
+            "speedup": scan_ms / index_ms if index_ms else float("inf"),
+        }
+    print_table(results)
+
+    # Lo que cuesta mantener los índices en cada escritura
+    rng = random.Random(1)
+    new = make_items(args.writes, seed=2)
+    for offset, item in enumerate(new):
+        item.id = args.items + offset
+    start = time.perf_counter()
+    for item in new:
+        inventory.add(item)
+    for item in new:
+        inventory.update(item.id, price=rng.randrange(50, 50_000) / 100, count=1)
+    for item in new:
+        inventory.remove(item.id)
+    per_write = (time.perf_counter() - start) / (3 * args.writes) * 1e6
+    print(f"\nadd/update/remove con índices: {per_write:.1f} µs por escritura")
+
+
+def bench_columnar(args: argparse.Namespace) -> None:
+    """Memoria y latencia: dict de `Item` Pydantic frente al backend columnar."""
+    import numpy as np
+
+    n = args.items
+    baseline, baseline_bytes = retained_bytes(
+        lambda: {item.id: item for item in iter_items(n)}
+    )
+    columnar, columnar_bytes = retained_bytes(
+        lambda: create_inventory(iter_items(n), Item.model_construct, backend="columnar")
+    )
+    print(f"{n:,} artículos")
+    print(f"  dict de Item : {baseline_bytes / n:8.1f} B/artículo")
+    print(f"  columnar     : {columnar_bytes / n:8.1f} B/artículo "
+          f"({baseline_bytes / columnar_bytes:.1f}x menos)\n")
+
+    results = {}
+    for name, filters in QUERIES.items():
+        scan_ms, expected = timed(
+            lambda: linear_query(baseline.values(), **filters), args.repeat
+        )
+        column_ms, found = timed(lambda: columnar.query(**filters), args.repeat)
+        assert [i.id for i in found] == sorted(i.id for i in expected), name
+        results[name] = {"matches": len(found), "dict ms": scan_ms, "columnar ms": column_ms}
+
+    # Agregado: valor del stock por categoría
+    def stock_value_loop() -> dict[Category, float]:
+        totals: dict[Category, float] = {}
+        for item in baseline.values():
+            totals[item.category] = totals.get(item.category, 0.0) + item.price * item.count
+        return totals
+
+    def stock_value_vectorized() -> dict[Category, float]:
+        price, count = columnar.column("price"), columnar.column("count")
+        sums = np.bincount(columnar.column("category"), weights=price * count)
+        return dict(zip(columnar.labels("category"), sums.tolist()))
+
+    loop_ms, expected = timed(stock_value_loop, args.repeat)
+    vector_ms, totals = timed(stock_value_vectorized, args.repeat)
+    assert all(abs(totals[c] - expected[c]) <= 1e-6 * expected[c] for c in expected)
+    results["stock value"] = {"matches": len(totals), "dict ms": loop_ms, "columnar ms": vector_ms}
+
+    # Actualización masiva: poner a 0 el stock de un 10 % de los artículos
+    ids = random.Random(3).sample(range(n), n // 10)
+
+    def bulk_loop() -> None:
+        for item_id in ids:
+            baseline[item_id].count = 0
+
+    loop_ms, _ = timed(bulk_loop, args.repeat)
+    vector_ms, _ = timed(lambda: columnar.update_many(ids, count=0), args.repeat)
+    assert set(ids) <= {item.id for item in columnar.query(count=0)}
+    results["bulk update"] = {"matches": len(ids), "dict ms": loop_ms, "columnar ms": vector_ms}
+    print_table(results)
+
+
+def bench_records(args: argparse.Namespace) -> None:
+    """Representación en memoria: modelo Pydantic, `ItemRecord` y columnas."""
+    n = args.items
+    rows = [(i.name, i.price, i.count, i.id, i.category) for i in iter_items(n)]
+    fields = ("name", "price", "count", "id", "category")
+
+    representations: dict[str, Callable[[], object]] = {
+        "dict de Item": lambda: {
+            row[3]: Item(**dict(zip(fields, row))) for row in rows
+        },
+        "dict de Item (construct)": lambda: {
+            row[3]: Item.model_construct(**dict(zip(fields, row))) for row in rows
+        },
+        "dict de ItemRecord": lambda: {row[3]: ItemRecord(*row) for row in rows},
+        "Inventory de ItemRecord": lambda: Inventory(ItemRecord(*row) for row in rows),
+        "columnar": lambda: create_inventory(
+            (ItemRecord(*row) for row in rows), ItemRecord, backend="columnar"
+        ),
+    }
+    results = {}
+    for name, build in representations.items():
+        start = time.perf_counter()
+        store, retained = retained_bytes(build)
+        seconds = time.perf_counter() - start  # incluye el sobrecoste de tracemalloc
+        results[name] = {"B/artículo": retained / n, "build s": seconds}
+        del store
+    print(f"{n:,} artículos (build s medido con tracemalloc activo)")
+    print_table(results)
+
+    # Serializar una respuesta grande: desde `Item`, desde registros sin
+    # validar (`RECORDS_JSON`) y validando cada registro como `Item` antes
+    # (lo que haría FastAPI con `response_model=list[Item]`)
+    m = min(n, args.serialize)
+    models = [Item.model_construct(**dict(zip(fields, row))) for row in rows[:m]]
+    records = [ItemRecord(*row) for row in rows[:m]]
+    items_adapter = TypeAdapter(list[Item])
+    cases: dict[str, Callable[[], bytes]] = {
+        "Item -> JSON": lambda: items_adapter.dump_json(models),
+        "ItemRecord -> JSON": lambda: RECORDS_JSON(records),
+        "ItemRecord -> Item -> JSON": lambda: items_adapter.dump_json(
+            items_adapter.validate_python(records, from_attributes=True)
+        ),
+    }
+    results, expected = {}, items_adapter.dump_json(models)
+    for name, serialize in cases.items():
+        ms, body = timed(serialize, args.repeat)
+        assert body == expected, name
+        results[name] = {"ms": ms, "artículos/s": m / ms * 1000}
+    print(f"\nserializar {m:,} artículos (mismos bytes en los tres casos)")
+    print_table(results)
+
+
+def open_durable(path: str, backend: str, **options) -> DurableInventory[Item]:
+    return DurableInventory(
+        path, Item.model_construct, category_type=Category, backend=backend, **options
+    )
+
+
+def bench_recovery(args: argparse.Namespace) -> None:
+    """Tiempo de arranque: snapshot + cola del log frente a reproducir todo el log."""
+    rng = random.Random(4)
+    results = {}
+    for n in args.sizes:
+        tail = n // 10
+        for label, snapshot in (("snapshot", True), ("solo log", False)):
+            path = tempfile.mkdtemp(prefix="inventory-")
+            try:
+                # Sin snapshots automáticos: el log tiene todo lo no compactado
+                store = open_durable(path, args.backend, fsync="os", snapshot_every=n + 2 * tail)
+                for item in iter_items(n):
+                    store.add(item)
+                if snapshot:
+                    store.snapshot()
+                for item_id in rng.sample(range(n), tail):
+                    store.update(item_id, count=rng.randrange(1_000))
+                expected = {i: (item.price, item.count) for i, item in store.items()}
+                store.close(snapshot=False)  # como una caída: la cola queda en el log
+
+                start = time.perf_counter()
+                reopened = open_durable(path, args.backend, fsync="os")
+                total = time.perf_counter() - start
+                assert {i: (it.price, it.count) for i, it in reopened.items()} == expected
+                recovery = reopened.recovery
+                reopened.close(snapshot=False)
+            finally:
+                shutil.rmtree(path)
+            results[f"{n:,} {label}"] = {
+                "replayed": recovery["replayed"],
+                "snapshot s": recovery["snapshot s"],
+                "replay s": recovery["replay s"],
+                "total s": total,
+            }
+    print_table(results)
+
+
+def bench_fsync(args: argparse.Namespace) -> None:
+    """µs por escritura con cada política de `fsync`."""
+    results = {}
+    for policy in ("always", "batch", "os"):
+        path = tempfile.mkdtemp(prefix="inventory-")
+        try:
+            store = open_durable(path, args.backend, fsync=policy)
+            items = make_items(args.writes)
+            start = time.perf_counter()
+            for item in items:
+                store.add(item)
+            elapsed = time.perf_counter() - start
+            store.close(snapshot=False)
+        finally:
+            shutil.rmtree(path)
+        results[policy] = {
+            "µs/write": elapsed / args.writes * 1e6,
+            "writes/s": args.writes / elapsed,
+        }
+    print_table(results)
+
+
+def bench_index(args: argparse.Namespace) -> None:
+    """`GET /`: serializar en cada petición frente a bytes cacheados, 304 y gzip."""
+    from fastapi.testclient import TestClient
+
+    import basic_app
+
+    store = basic_app.items
+    for item in iter_items(args.items):
+        item.id += 1_000  # no pisar los artículos de ejemplo
+        store.add(ItemRecord.of(item))
+
+    # El `index()` original, para comparar
+    @basic_app.app.get("/_uncached", response_model=basic_app.Index)
+    def uncached() -> dict:
+        return {"items": store}
+
+    client = TestClient(basic_app.app)
+    identity = {"accept-encoding": "identity"}
+    plain = client.get("/", headers=identity)
+    assert plain.json() == client.get("/_uncached", headers=identity).json()
+    etag = plain.headers["etag"]
+    assert client.get("/", headers={"if-none-match": etag}).status_code == 304
+    packed = client.get("/", headers={"accept-encoding": "gzip"})
+    assert packed.headers["content-encoding"] == "gzip"
+    assert json.loads(packed.content) == plain.json()  # httpx ya descomprime
+    raw = gzip.compress(plain.content)
+    print(f"{len(store):,} artículos: {len(plain.content) / 1e6:.1f} MB JSON, "
+          f"~{len(raw) / 1e6:.1f} MB gzip\n")
+
+    def bump() -> None:
+        store.update(1_000, count=store[1_000].count + 1)
+
+    def cold() -> None:  # una escritura antes de cada lectura: siempre serializa
+        bump()
+        client.get("/", headers=identity)
+
+    cases = {
+        "sin caché": lambda: client.get("/_uncached", headers=identity),
+        "tras escritura": cold,
+        "cacheado": lambda: client.get("/", headers=identity),
+        "cacheado gzip": lambda: client.get("/", headers={"accept-encoding": "gzip"}),
+        "304": lambda: client.get("/", headers={"if-none-match": etag}),
+    }
+    results = {}
+    for name, request in cases.items():
+        if name == "304":  # ETag de la versión actual (`cold` la ha cambiado)
+            etag = client.get("/", headers=identity).headers["etag"]
+        ms, _ = timed(request, args.repeat)
+        results[name] = {"ms": ms}
+    # (la variante gzip incluye descomprimirla en el cliente de prueba)
+    assert client.get("/", headers={"if-none-match": etag}).status_code == 304
+    bump()
+    assert client.get("/", headers={"if-none-match": etag}).status_code == 200
+    print_table(results)
+
+
+class GlobalLockInventory:
+    """Referencia: un único lock para lecturas y escrituras."""
+
+    def __init__(self, store: InventoryStore[Item]) -> None:
+        self._store = store
+        self._lock = threading.Lock()
+
+    def __getitem__(self, item_id: int) -> Item:
+        with self._lock:
+            return self._store[item_id]
+
+    def query(self, **filters) -> list[Item]:
+        with self._lock:
+            return self._store.query(**filters)
+
+    def update(self, item_id: int, **changes) -> Item:
+        with self._lock:
+            return self._store.update(item_id, **changes)
+
+
+def run_threads(workers: int, target: Callable[[int], None]) -> float:
+    """Ejecuta `target(i)` en `workers` hilos a la vez; devuelve los segundos."""
+    barrier = threading.Barrier(workers + 1)
+
+    def run(i: int) -> None:
+        barrier.wait()
+        target(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def bench_threads(args: argparse.Namespace) -> None:
+    """Varios hilos: actualizaciones perdidas, lecturas rotas y ops/s por hilos."""
+    hot = range(args.hot)
+
+    def fresh() -> ConcurrentInventory[Item]:
+        store = ConcurrentInventory(
+            create_inventory(iter_items(args.items), Item.model_construct, backend=args.backend)
+        )
+        for item_id in hot:  # invariante que comprueban los lectores
+            store.update(item_id, count=0, price=0.0)
+        return store
+
+    # Cambios de hilo muy frecuentes para provocar intercalados
+    switch = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        results = {}
+        for mode in ("If-Match", "sin versión"):
+            store = fresh()
+            conflicts = torn = 0
+            writing = threading.Event()
+            writing.set()
+
+            def increment(worker: int) -> None:
+                nonlocal conflicts
+                rng = random.Random(worker)
+                for _ in range(args.increments):
+                    item_id = rng.choice(hot)
+                    while True:
+                        item, version = store.versioned(item_id)
+                        count = item.count + 1
+                        try:
+                            store.update(
+                                item_id,
+                                if_version=version if mode == "If-Match" else None,
+                                count=count,
+                                price=count / 100,
+                            )
+                            break
+                        except VersionConflict:
+                            conflicts += 1
+
+            def check_reads() -> None:
+                nonlocal torn
+                while writing.is_set():
+                    for item_id in hot:
+                        item = store[item_id]
+                        if item.price != item.count / 100:
+                            torn += 1
+
+            reader = threading.Thread(target=check_reads)
+            reader.start()
+            run_threads(args.threads, increment)
+            writing.clear()
+            reader.join()
+            expected = args.threads * args.increments
+            total = sum(store[i].count for i in hot)
+            results[mode] = {
+                "expected": expected, "applied": total,
+                "lost": expected - total, "conflicts": conflicts, "torn reads": torn,
+            }
+        assert results["If-Match"]["lost"] == 0
+        assert all(row["torn reads"] == 0 for row in results.values())
+    finally:
+        sys.setswitchinterval(switch)
+    print(f"{args.threads} hilos × {args.increments:,} incrementos sobre {args.hot} artículos")
+    print_table(results)
+
+    # Rendimiento: 90 % lecturas (get / query), 10 % escrituras
+    print(f"\n{args.ops:,} operaciones repartidas entre los hilos (ops/s)")
+    names = [f"item-{i}" for i in range(max(1, args.items // 100))]
+    throughput = {}
+    for workers in args.workers:
+        row = {}
+        for label, wrap in (("global lock", GlobalLockInventory), ("concurrent", None)):
+            store = fresh() if wrap is None else wrap(
+                create_inventory(iter_items(args.items), Item.model_construct, backend=args.backend)
+            )
+
+            def mixed(worker: int) -> None:
+                rng = random.Random(worker)
+                for _ in range(args.ops // workers):
+                    op = rng.random()
+                    if op < 0.1:
+                        store.update(rng.randrange(args.items), count=rng.randrange(1_000))
+                    elif op < 0.55:
+                        store[rng.randrange(args.items)]
+                    else:
+                        store.query(name=rng.choice(names))
+
+            row[label] = args.ops / run_threads(workers, mixed)
+        throughput[f"{workers} hilos"] = row
+    print_table(throughput)
+
+
+def bench_batch(args: argparse.Namespace) -> None:
+    """Cambios por HTTP: una petición por artículo frente a `POST /items/batch`."""
+    from fastapi.testclient import TestClient
+
+    import basic_app
+
+    client = TestClient(basic_app.app)
+    store = basic_app.items
+    n = args.ops // 2  # n upserts nuevos, n/2 patches y n/2 deletes
+
+    def operations(base: int) -> list[dict]:
+        ops = []
+        for item in iter_items(n, seed=5):
+            item.id += base
+            ops.append({"op": "upsert", "item": item.model_dump(mode="json")})
+        for offset in range(0, n, 2):
+            ops.append({"op": "patch", "id": base + offset, "count": offset})
+            ops.append({"op": "delete", "id": base + offset + 1})
+        return ops
+
+    def single(ops: list[dict]) -> None:
+        for op in ops:
+            if op["op"] == "upsert":
+                response = client.post("/", json=op["item"])
+            elif op["op"] == "patch":
+                response = client.put(f"/items/{op['id']}", params={"count": op["count"]})
+            else:
+                response = client.delete(f"/items/{op['id']}")
+            assert response.status_code == 200, response.text
+
+    def batch(ops: list[dict], chunk: int, ndjson: bool = False, atomic: bool = False) -> None:
+        params = {"atomic": "true"} if atomic else {}
+        for start in range(0, len(ops), chunk):
+            part = ops[start : start + chunk]
+            if ndjson:
+                response = client.post(
+                    "/items/batch",
+                    params=params,
+                    content="\n".join(map(json.dumps, part)),
+                    headers={"content-type": "application/x-ndjson"},
+                )
+            else:
+                response = client.post("/items/batch", params=params, json=part)
+            assert response.json()["failed"] == 0
+
+    cases = {
+        "uno a uno": single,
+        f"lotes de {args.chunk:,}": lambda ops: batch(ops, args.chunk),
+        f"lotes de {args.chunk:,} ndjson": lambda ops: batch(ops, args.chunk, ndjson=True),
+        "un lote atómico": lambda ops: batch(ops, len(ops), atomic=True),
+    }
+    results, states = {}, []
+    for case, (name, run) in enumerate(cases.items()):
+        base = 1_000_000 * (case + 1)
+        ops = operations(base)
+        start = time.perf_counter()
+        run(ops)
+        elapsed = time.perf_counter() - start
+        results[name] = {"s": elapsed, "ops/s": len(ops) / elapsed}
+        # Mismo estado final con cualquier vía, con los índices al día
+        states.append({
+            item.id - base: (item.name, item.price, item.count)
+            for item in store.values() if base <= item.id < base + 1_000_000
+        })
+        assert states[-1] == states[0], name
+        some = next(iter(states[-1].values()))[0]
+        assert [i.id for i in store.query(name=some)] == sorted(
+            i.id for i in store.values() if i.name == some
+        )
+    served = client.get("/").json()["items"]
+    assert len(served) == len(store)
+
+    # Un artículo borrado y vuelto a crear no repite el ETag del anterior: el
+    # If-Match del borrado no debe valer para el nuevo
+    old = client.get("/items/0")
+    assert client.delete("/items/0").status_code == 200
+    assert client.post("/", json=old.json()).status_code == 200
+    stale = client.put("/items/0", params={"count": 1}, headers={"If-Match": old.headers["ETag"]})
+    assert stale.status_code == 412, stale.status_code
+
+    # Un precio NaN es un 422 (y no un 500 al devolver el error); un precio
+    # negativo o cero sigue siendo válido
+    nan = client.post(
+        "/",
+        content=json.dumps({**old.json(), "id": -1, "price": math.nan}),
+        headers={"content-type": "application/json"},
+    )
+    assert nan.status_code == 422 and nan.json()["detail"][0]["input"] == "NaN", nan.text
+    assert client.post("/", json={**old.json(), "id": -1, "price": -1.0}).status_code == 200
+    print(f"{len(ops):,} operaciones ({n:,} upserts, {n // 2:,} patches, {n // 2:,} deletes)")
+    print_table(results)
+
+
+def same_stats(maintained: dict, expected: dict) -> bool:
+    """Igualdad exacta salvo el valor del stock (tolerancia relativa 1e-9)."""
+    if maintained.keys() != expected.keys():
+        return False
+    for category, row in expected.items():
+        got = maintained[category]
+        if any(got[k] != row[k] for k in ("count", "units", "min_price", "max_price")):
+            return False
+        if not math.isclose(got["stock_value"], row["stock_value"], rel_tol=1e-9):
+            return False
+    return True
+
+
+def bench_stats(args: argparse.Namespace) -> None:
+    """`/items/stats`: agregados mantenidos frente a recalcular, tras mutaciones aleatorias."""
+    store = ConcurrentInventory(
+        create_inventory(iter_items(args.items), Item.model_construct, backend=args.backend)
+    )
+    rng = random.Random(6)
+    categories = list(Category)
+    next_id = args.items
+    live = list(range(args.items))
+
+    def new_item() -> Item:
+        nonlocal next_id
+        next_id += 1
+        return Item.model_construct(
+            name=f"item-{rng.randrange(100)}", price=rng.randrange(1, 100_000) / 100,
+            count=rng.randrange(1_000), id=next_id, category=rng.choice(categories),
+        )
+
+    start = time.perf_counter()
+    writes = 0
+    for _ in range(args.rounds):
+        for _ in range(args.mutations):
+            op = rng.random()
+            if op < 0.3 or not live:
+                item = store.add(new_item())
+                live.append(item.id)
+            elif op < 0.7:
+                changes = rng.choice([
+                    {"price": rng.randrange(1, 100_000) / 100},
+                    {"count": rng.randrange(1_000)},
+                    {"price": rng.randrange(1, 1_000) / 100, "count": 0},
+                ])
+                store.update(rng.choice(live), **changes)
+            elif op < 0.95:
+                index = rng.randrange(len(live))
+                live[index], live[-1] = live[-1], live[index]
+                store.remove(live.pop())
+            else:
+                # Lote atómico que falla al final: todo se deshace
+                victim = rng.choice(live)
+                batch = [
+                    Change("upsert", next_id + 1, item=new_item()),
+                    Change("patch", victim, changes={"price": 0.01, "count": 999}),
+                    Change("delete", victim),
+                    Change("delete", -1),
+                ]
+                assert store.apply(batch, atomic=True)[-1] == "not found"
+            writes += 1
+        assert same_stats(store.stats(), recompute(store.values())), "desviación"
+    per_write = (time.perf_counter() - start) / writes * 1e6
+    print(f"{writes:,} mutaciones aleatorias en {args.rounds} rondas: agregados "
+          f"idénticos al recálculo ({per_write:.1f} µs por escritura, con comprobaciones)\n")
+
+    maintained_ms, _ = timed(store.stats, args.repeat)
+    recompute_ms, _ = timed(lambda: recompute(store.values()), args.repeat)
+    print_table({
+        f"{len(store):,} artículos": {"stats ms": maintained_ms, "recompute ms": recompute_ms},
+    })
+
+
+def rss_bytes() -> int:
+    """RSS actual del proceso (Linux)."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class PeakRSS:
+    """Muestrea el RSS cada pocos ms mientras dura el bloque `with`."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.start = self.peak = 0
+        self._done = threading.Event()
+
+    def __enter__(self) -> PeakRSS:
+        self.start = self.peak = rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self) -> None:
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __exit__(self, *exc) -> None:
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+async def call_asgi(
+    app, method: str, path: str, query: str = "",
+    body: Iterable[bytes] = (), sink: Callable[[bytes], object] = lambda chunk: None,
+) -> int:
+    """
+    Una petición directa a la app ASGI, sin cliente HTTP: el cuerpo se envía
+    por trozos y la respuesta se entrega a `sink` según llega (httpx la
+    acumularía entera en memoria).
+    """
+    chunks = iter(body)
+    finished = asyncio.Event()
+    status = 0
+    body_sent = False
+
+    async def receive() -> dict:
+        nonlocal body_sent
+        chunk = next(chunks, None)
+        if chunk is not None:
+            return {"type": "http.request", "body": chunk, "more_body": True}
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()  # como un cliente que espera la respuesta entera
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            sink(message.get("body", b""))
+            if not message.get("more_body"):
+                finished.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": query.encode(),
+        "headers": [(b"content-type", b"application/x-ndjson")],
+        "client": ("bench", 0), "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+    return status
+
+
+def ndjson_child(args: argparse.Namespace) -> None:
+    """Un lado del viaje de ida y vuelta, en un proceso propio para medir su RSS."""
+    import basic_app
+
+    if args.side == "export":
+        basic_app.items = ConcurrentInventory(
+            memory_inventory(map(ItemRecord.of, iter_items(args.items)), ItemRecord)
+        )
+        gc.collect()
+        written = 0
+        with open(args.path, "wb") as f, PeakRSS() as rss:
+            def sink(chunk: bytes) -> None:
+                nonlocal written
+                written += len(chunk)
+                f.write(chunk)
+
+            start = time.perf_counter()
+            status = asyncio.run(call_asgi(basic_app.app, "GET", "/items/export", sink=sink))
+            elapsed = time.perf_counter() - start
+        assert status == 200
+    else:
+        response = bytearray()
+
+        def read_file() -> Iterator[bytes]:
+            with open(args.path, "rb") as f:
+                while chunk := f.read(64 * 1024):
+                    yield chunk
+
+        gc.collect()
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            status = asyncio.run(call_asgi(
+                basic_app.app, "POST", "/items/import", f"batch_size={args.batch}",
+                body=read_file(), sink=response.extend,
+            ))
+            elapsed = time.perf_counter() - start
+        result = json.loads(response)
+        assert status == 200 and not result.get("failed"), result
+        assert len(basic_app.items) == args.items
+        written = os.path.getsize(args.path)
+    print(json.dumps({
+        "items/s": args.items / elapsed,
+        "MB/s": written / elapsed / 1e6,
+        "s": elapsed,
+        "RSS base MB": rss.start / 1e6,
+        "RSS +pico MB": (rss.peak - rss.start) / 1e6,
+        "RSS final MB": rss_bytes() / 1e6,
+    }))
+
+
+def check_ndjson_lines() -> None:
+    """
+    Cada línea es un artículo: las que solo son válidas unidas a otras (un
+    objeto partido, dos objetos en una línea) son errores con su número.
+    """
+    from fastapi.testclient import TestClient
+
+    import basic_app
+
+    def item(item_id: int) -> str:
+        return json.dumps(
+            {"name": f"n{item_id}", "price": 1.5, "count": 1, "id": item_id, "category": "tools"}
+        )
+
+    client = TestClient(basic_app.app)
+    cases = [  # (líneas, líneas con error)
+        ([item(50) + ',{"name":"B","price":1', '"count":1,"id":51,"category":"tools"}',
+          item(52)], [1, 2]),
+        ([item(53) + "," + item(54), item(55)], [1]),
+    ]
+    for lines, failed in cases:
+        result = client.post(
+            "/items/import", content="\n".join(lines) + "\n",
+            headers={"Content-Type": "application/x-ndjson"},
+        ).json()
+        assert result["created"] == 1, result
+        assert [error["line"] for error in result["errors"]] == failed, result
+
+
+def bench_ndjson(args: argparse.Namespace) -> None:
+    """Exportar e importar en NDJSON: ritmo y memoria de cada lado."""
+    check_ndjson_lines()
+    env = {**os.environ, "INVENTORY_BACKEND": args.backend}
+    env.pop("INVENTORY_DATA_DIR", None)
+    results = {}
+    for n in args.items:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "items.ndjson")
+            for side in ("export", "import"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "_ndjson", side, path, str(n), str(args.batch)],
+                    env=env, check=True, capture_output=True, text=True,
+                ).stdout
+                results[f"{n:,} {side}"] = json.loads(out.splitlines()[-1])
+            size = os.path.getsize(path)
+        print(f"{n:,} artículos: {size / 1e6:,.0f} MB de NDJSON")
+    print(f"\nbackend {args.backend}, lotes de importación de {args.batch:,}")
+    print_table(results)
+
+
+async def subscribe(
+    app, query: str, sink: Callable[[bytes], object],
+    stop: asyncio.Event, stall: asyncio.Event | None = None,
+) -> None:
+    """
+    Un suscriptor de `GET /items/changes` hasta que se activa `stop`. Con
+    `stall`, el primer envío con eventos no termina hasta que se activa: un
+    cliente que no lee (el buffer TCP lleno) y retiene su respuesta.
+    """
+    async def receive() -> dict:
+        await stop.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        nonlocal stall
+        body = message.get("body", b"")
+        if stall is not None and b"\nid: " in body:
+            await stall.wait()
+            stall = None
+        sink(body)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/items/changes",
+        "raw_path": b"/items/changes", "root_path": "", "query_string": query.encode(),
+        "headers": [], "client": ("bench", 0), "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+
+
+class FeedClient:
+    """Cuenta lo que recibe un suscriptor y la latencia desde la escritura."""
+
+    def __init__(self, published: dict[int, float]) -> None:
+        self.published = published
+        self.connected = asyncio.Event()
+        self.events = self.resets = self.last_seq = 0
+        self.latencies: list[float] = []
+
+    def __call__(self, chunk: bytes) -> None:
+        now = time.perf_counter()
+        self.connected.set()
+        self.events += chunk.count(b"event: updated")
+        self.resets += chunk.count(b"event: reset")
+        start = chunk.rfind(b"\nid: ")  # último evento del envío
+        if start < 0:
+            return
+        line = chunk[start + 5 : chunk.index(b"\n", start + 1)]
+        seq = int(line.partition(b".")[2])
+        assert seq > self.last_seq, "eventos desordenados o repetidos"
+        self.last_seq = seq
+        if seq in self.published:  # los `reset` no tienen escritura propia
+            self.latencies.append(now - self.published[seq])
+
+
+def bench_feed(args: argparse.Namespace) -> None:
+    """`GET /items/changes`: reparto a muchos suscriptores SSE sin frenar a los escritores."""
+    import basic_app
+
+    store = basic_app.items
+    store.feed = ChangeFeed(args.capacity)
+    for item in iter_items(args.items):
+        item.id += 1_000
+        store.add(ItemRecord.of(item))
+    ids = [item_id for item_id in store if item_id >= 1_000]
+
+    def writer(published: dict[int, float]) -> list[float]:
+        """`args.writes` actualizaciones a `args.rate` por segundo; µs de cada una."""
+        durations, interval = [], 1 / args.rate
+        start = time.perf_counter()
+        for i in range(args.writes):
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            before = time.perf_counter()
+            store.update(ids[i % len(ids)], count=i)
+            after = time.perf_counter()
+            published[store.feed.last_seq] = after
+            durations.append((after - before) * 1e6)
+        return durations
+
+    async def run(subscribers: int, stalled: int) -> dict[str, float]:
+        published: dict[int, float] = {}
+        stop, stall = asyncio.Event(), asyncio.Event()
+        clients = [FeedClient(published) for _ in range(subscribers + stalled)]
+        tasks = [
+            asyncio.create_task(subscribe(
+                basic_app.app, "", client, stop, stall if i >= subscribers else None
+            ))
+            for i, client in enumerate(clients)
+        ]
+        await asyncio.gather(*(client.connected.wait() for client in clients))
+        first = store.feed.last_seq
+
+        start = time.perf_counter()
+        durations = await asyncio.to_thread(writer, published)
+        last = store.feed.last_seq
+        healthy, slow = clients[:subscribers], clients[subscribers:]
+        while any(client.last_seq < last for client in healthy):
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+
+        stall.set()  # los atascados vuelven a leer: el anillo ya les dio la vuelta
+        while any(client.last_seq < last for client in slow):
+            await asyncio.sleep(0.01)
+        stop.set()
+        await asyncio.gather(*tasks)
+
+        for client in healthy:
+            assert client.events == last - first and not client.resets, "eventos perdidos"
+        if last - first > args.capacity:
+            assert all(client.resets == 1 for client in slow), "sin reset"
+        latencies = sorted(x for client in healthy for x in client.latencies) or [0.0]
+        durations.sort()
+        return {
+            "writes/s": args.writes / elapsed,
+            "write p99 µs": durations[int(0.99 * len(durations))],
+            "write max µs": durations[-1],
+            "events/s": sum(client.events for client in healthy) / elapsed,
+            "lat p50 ms": latencies[len(latencies) // 2] * 1000,
+            "lat p99 ms": latencies[int(0.99 * len(latencies))] * 1000,
+            "resets": sum(client.resets for client in clients),
+        }
+
+    results = {}
+    for subscribers, stalled in ((0, 0), (args.subscribers, 0), (args.subscribers, args.stalled)):
+        name = f"{subscribers} subs" + (f" + {stalled} atascados" if stalled else "")
+        results[name] = asyncio.run(run(subscribers, stalled))
+    print(f"{args.writes:,} escrituras a {args.rate:,}/s, anillo de {args.capacity:,} eventos; "
+          f"todos los suscriptores recibieron cada evento, en orden\n")
+    print_table(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("query", help=bench_query.__doc__)
+    p.add_argument("--items", type=int, default=1_000_000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--writes", type=int, default=10_000)
+    p.set_defaults(func=bench_query)
+
+    p = sub.add_parser("columnar", help=bench_columnar.__doc__)
+    p.add_argument("--items", type=int, default=1_000_000)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_columnar)
+
+    p = sub.add_parser("records", help=bench_records.__doc__)
+    p.add_argument("--items", type=int, default=1_000_000)
+    p.add_argument("--serialize", type=int, default=100_000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_records)
+
+    p = sub.add_parser("recovery", help=bench_recovery.__doc__)
+    p.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p.add_argument("--backend", choices=("dict", "columnar"), default="dict")
+    p.set_defaults(func=bench_recovery)
+
+    p = sub.add_parser("fsync", help=bench_fsync.__doc__)
+    p.add_argument("--writes", type=int, default=5_000)
+    p.add_argument("--backend", choices=("dict", "columnar"), default="dict")
+    p.set_defaults(func=bench_fsync)
+
+    p = sub.add_parser("index", help=bench_index.__doc__)
+    p.add_argument("--items", type=int, default=100_000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_index)
+
+    p = sub.add_parser("threads", help=bench_threads.__doc__)
+    p.add_argument("--items", type=int, default=100_000)
+    p.add_argument("--backend", choices=("dict", "columnar"), default="dict")
+    p.add_argument("--hot", type=int, default=8)
+    p.add_argument("--threads", type=int, default=8)
+    p.add_argument("--increments", type=int, default=2_000)
+    p.add_argument("--ops", type=int, default=50_000)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    p.set_defaults(func=bench_threads)
+
+    p = sub.add_parser("batch", help=bench_batch.__doc__)
+    p.add_argument("--ops", type=int, default=20_000)
+    p.add_argument("--chunk", type=int, default=1_000)
+    p.set_defaults(func=bench_batch)
+
+    p = sub.add_parser("stats", help=bench_stats.__doc__)
+    p.add_argument("--items", type=int, default=100_000)
+    p.add_argument("--backend", choices=("dict", "columnar"), default="dict")
+    p.add_argument("--rounds", type=int, default=20)
+    p.add_argument("--mutations", type=int, default=5_000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_stats)
+
+    p = sub.add_parser("ndjson", help=bench_ndjson.__doc__)
+    p.add_argument("--items", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    p.add_argument("--backend", choices=("dict", "columnar"), default="columnar")
+    p.add_argument("--batch", type=int, default=5_000)
+    p.set_defaults(func=bench_ndjson)
+
+    p = sub.add_parser("feed", help=bench_feed.__doc__)
+    p.add_argument("--items", type=int, default=10_000)
+    p.add_argument("--subscribers", type=int, default=1_000)
+    p.add_argument("--stalled", type=int, default=10)
+    p.add_argument("--writes", type=int, default=5_000)
+    p.add_argument("--rate", type=int, default=1_000)
+    p.add_argument("--capacity", type=int, default=2_000)
+    p.set_defaults(func=bench_feed)
+
+    p = sub.add_parser("_ndjson")
+    p.add_argument("side", choices=("export", "import"))
+    p.add_argument("path")
+    p.add_argument("items", type=int)
+    p.add_argument("batch", type=int)
+    p.set_defaults(func=ndjson_child)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
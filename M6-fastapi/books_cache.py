@@ -0,0 +1,124 @@
+"""
+Caché de lectura para el servicio de libros
+===========================================
+
+`BookCache` define la interfaz mínima (get / set / delete / clear + contadores)
+que usa `fastapi_sqlalchemy.py`; `LRUTTLCache` es la implementación en memoria
+del proceso que se usa por defecto. Un backend compartido (Redis, memcached...)
+solo tiene que implementar los mismos métodos.
+
+Las búsquedas fallidas también se cachean (*negative caching*) guardando
+`None`, con su propio TTL, más corto. Por eso `get` devuelve el centinela
+`MISSING` cuando la clave no está en caché.
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Hashable
+
+MISSING: Any = object()  # "no está en caché" (distinto de `None` = "no existe")
+
+
+@dataclass
+class CacheStats:
+    """Contadores acumulados desde el arranque."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+class BookCache(ABC):
+    """Interfaz de una caché clave -> valor con expiración."""
+
+    stats: CacheStats
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Any:
+        """Valor cacheado (puede ser `None`) o `MISSING` si no está o caducó."""
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any) -> None:
+        """Guarda `value`; `None` se guarda como entrada negativa."""
+
+    @abstractmethod
+    def delete(self, key: Hashable) -> None:
+        """Invalida `key` si estaba en caché."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Vacía la caché."""
+
+    def __len__(self) -> int:
+        return 0
+
+
+class LRUTTLCache(BookCache):
+    """
+    Caché en memoria acotada a `maxsize` entradas con expulsión LRU.
+
+    `OrderedDict` mantiene el orden de uso: cada acierto mueve la clave al
+    final y, al superar `maxsize`, se expulsa la del principio. Cada entrada
+    guarda su instante de caducidad (`ttl` o `negative_ttl`). Un `Lock`
+    protege la estructura porque los handlers síncronos corren en varios hilos.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 60.0, negative_ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stats = CacheStats()
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
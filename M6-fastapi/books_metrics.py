@@ -0,0 +1,280 @@
+"""
+Métricas del servicio de libros en formato Prometheus
+=====================================================
+
+Sin dependencias externas: contadores, histogramas y *gauges* mínimos que
+se exponen como texto (`text/plain; version=0.0.4`) en `GET /metrics`.
+
+*  `MetricsMiddleware`   → latencia por ruta (plantilla, no URL concreta) y
+                           nº/tiempo de sentencias SQL por petición.
+*  `instrument_engine`   → eventos de SQLAlchemy que cronometran cada sentencia.
+*  `TimedQueuePool`      → pool que mide la espera hasta obtener conexión.
+*  `pool_gauges`         → conexiones en uso, overflow y tamaño del pool del
+                           primario y de cada réplica.
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from collections.abc import Callable, Iterable
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas (una serie por combinación)."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name, self.help = name, help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: dict[tuple[str, ...], list] = {}  # labels -> [counts, sum, n]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in self._series.items()]
+        for labels, counts, total, n in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            inf = _labels(self.labelnames, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{inf} {n}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {n}"
+
+
+class Callback:
+    """
+    Métrica cuyo valor se lee al exportar (gauge o contador ajeno). Con
+    `labelnames`, `fn` devuelve un valor por combinación de etiquetas.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], float | dict[tuple[str, ...], float] | None],
+        kind: str = "gauge",
+        labelnames: tuple[str, ...] = (),
+    ) -> None:
+        self.name, self.help, self.fn, self.kind = name, help, fn, kind
+        self.labelnames = labelnames
+
+    def render(self) -> Iterable[str]:
+        value = self.fn()
+        series = value if self.labelnames else {(): value}
+        if not series or None in series.values():
+            return
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, each in series.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {each}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[Histogram | Callback] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        lines = [line for metric in self.metrics for line in metric.render()]
+        return ("\n".join(lines) + "\n").encode()
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "books_http_request_duration_seconds",
+    "Latencia de las peticiones HTTP por ruta.",
+    ("method", "route", "status"),
+))
+SQL_PER_REQUEST = registry.register(Histogram(
+    "books_db_statements_per_request",
+    "Sentencias SQL ejecutadas por petición.",
+    ("method", "route"),
+    COUNT_BUCKETS,
+))
+SQL_TIME_PER_REQUEST = registry.register(Histogram(
+    "books_db_time_per_request_seconds",
+    "Tiempo total en SQL por petición.",
+    ("method", "route"),
+))
+SQL_DURATION = registry.register(Histogram(
+    "books_db_statement_duration_seconds",
+    "Duración de cada sentencia SQL.",
+))
+POOL_WAIT = registry.register(Histogram(
+    "books_db_pool_wait_seconds",
+    "Espera hasta obtener una conexión del pool.",
+))
+
+
+# --------------------------------------------------------------------------- #
+#               Petición en curso (middleware ASGI)                           #
+# --------------------------------------------------------------------------- #
+
+# [sentencias, segundos] de la petición en curso. Los handlers síncronos
+# corren en el threadpool con una copia del contexto, así que mutar la lista
+# (no reasignar la variable) es visible para el middleware.
+_request_sql: ContextVar[list | None] = ContextVar("books_request_sql", default=None)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro (sin `BaseHTTPMiddleware`, que añade una tarea y
+    colas por petición). La ruta se etiqueta con su plantilla
+    (`/books/{book_id}`) para no crear una serie por cada id.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sql = [0, 0.0]
+        token = _request_sql.set(sql)
+        status = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_sql.reset(token)
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            method = scope["method"]
+            REQUEST_LATENCY.observe(elapsed, method, route, str(status))
+            SQL_PER_REQUEST.observe(sql[0], method, route)
+            SQL_TIME_PER_REQUEST.observe(sql[1], method, route)
+
+
+# --------------------------------------------------------------------------- #
+#               SQLAlchemy: sentencias y pool                                 #
+# --------------------------------------------------------------------------- #
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("books_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["books_query_start"].pop()
+    SQL_DURATION.observe(elapsed)
+    sql = _request_sql.get()
+    if sql is not None:
+        sql[0] += 1
+        sql[1] += elapsed
+
+
+def _handle_error(context) -> None:
+    # Si la sentencia falla no hay `after_cursor_execute`: descartar su inicio
+    conn = context.connection
+    if conn is not None and conn.info.get("books_query_start"):
+        conn.info["books_query_start"].pop()
+
+
+def instrument_engine(engine) -> None:
+    """Cronometra cada sentencia de `engine` (síncrono o `AsyncEngine`)."""
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+class _TimedGet:
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_TimedGet, QueuePool):
+    """`QueuePool` que mide cuánto espera cada checkout."""
+
+
+class TimedAsyncQueuePool(_TimedGet, AsyncAdaptedQueuePool):
+    """`AsyncAdaptedQueuePool` que mide cuánto espera cada checkout."""
+
+
+def pool_gauges(get_engines: Callable[[], list]) -> None:
+    """
+    Registra gauges del pool de cada motor que devuelva `get_engines()`: el
+    primario primero y después las réplicas, con la etiqueta `db`
+    (`primary`, `replica0`, `replica1`...).
+    """
+
+    def read(attr: str) -> Callable[[], dict[tuple[str, ...], float]]:
+        def value() -> dict[tuple[str, ...], float]:
+            engines = get_engines()
+            names = ["primary", *(f"replica{i}" for i in range(len(engines) - 1))]
+            # `overflow()` es negativo mientras no se llena `pool_size`
+            return {
+                (name,): max(0, getattr(engine.pool, attr)())
+                for name, engine in zip(names, engines)
+            }
+        return value
+
+    for name, help, attr in (
+        ("books_db_pool_checked_out", "Conexiones en uso.", "checkedout"),
+        ("books_db_pool_overflow", "Conexiones por encima de pool_size.", "overflow"),
+        ("books_db_pool_size", "Tamaño configurado del pool.", "size"),
+    ):
+        registry.register(Callback(name, help, read(attr), labelnames=("db",)))
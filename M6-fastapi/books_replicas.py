@@ -0,0 +1,81 @@
+"""
+Enrutado de lecturas a réplicas
+===============================
+
+`ReplicaRouter` decide qué motor usa cada lectura: una réplica elegida por
+*round-robin* o por *least-connections* (la que menos conexiones tiene en uso
+en su pool), o el primario si no hay réplicas o si el cliente está "anclado".
+
+Read-your-writes: tras una escritura la respuesta lleva la cookie
+`books_primary_until` con el instante hasta el que ese cliente debe leer del
+primario, para no ver una réplica que aún no ha replicado su cambio. Al ir en
+la cookie, funciona igual con varios workers o instancias.
+
+Lo usan las dos apps de libros: `M6-flask/books_replicas.py` es un enlace
+simbólico a este fichero (cada app se ejecuta desde su directorio, sin un
+paquete común que importar).
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import itertools
+import math
+import time
+from typing import Generic, Literal, Sequence, TypeVar
+
+E = TypeVar("E")  # Engine o AsyncEngine
+
+Policy = Literal["round_robin", "least_connections"]
+
+PIN_COOKIE = "books_primary_until"
+
+
+class ReplicaRouter(Generic[E]):
+    """Elige el motor de cada lectura: primario o una de las réplicas."""
+
+    def __init__(self, primary: E, replicas: Sequence[E] = (), policy: Policy = "round_robin"):
+        if policy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica policy: {policy!r}")
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.policy = policy
+        self._turn = itertools.count()  # `next()` es atómico con el GIL
+
+    @property
+    def engines(self) -> list[E]:
+        return [self.primary, *self.replicas]
+
+    def for_read(self, pinned: bool = False) -> E:
+        if pinned or not self.replicas:
+            return self.primary
+        start = next(self._turn) % len(self.replicas)
+        if self.policy == "least_connections":
+            # Empates (p. ej. todas a 0) se reparten empezando por turnos
+            rotated = self.replicas[start:] + self.replicas[:start]
+            return min(rotated, key=lambda engine: engine.pool.checkedout())
+        return self.replicas[start]
+
+    def for_write(self) -> E:
+        return self.primary
+
+
+def pinned_until(window: float) -> str:
+    """Valor de la cookie de anclaje para una escritura hecha ahora."""
+    return f"{time.time() + window:.3f}"
+
+
+def is_pinned(cookie: str | None, window: float) -> bool:
+    """
+    ¿Debe este cliente leer aún del primario? La cookie la escribe el
+    cliente: un instante más allá de `window` (p. ej. `inf`) no lo ancla.
+    """
+    if cookie is None:
+        return False
+    try:
+        until = float(cookie)
+    except ValueError:
+        return False
+    now = time.time()
+    return math.isfinite(until) and now < until <= now + window
@@ -0,0 +1,427 @@
+"""
+Inventario en memoria con índices secundarios
+=============================================
+
+Sustituye al `dict` de `basic_app.py`. Además de `id -> Item` mantiene:
+
+*  índices hash `valor -> {ids}` para `name`, `category` y `count`;
+*  un índice ordenado por `(price, id)` (`PriceIndex`, troceado en bloques)
+   que resuelve igualdad y rangos de precio con `bisect`.
+
+`query()` obtiene el conjunto candidato de cada filtro, empieza por el más
+pequeño e intersecta con los demás de menor a mayor, parando en cuanto se
+queda vacío: el coste depende del tamaño de la respuesta, no de N × filtros.
+
+Los índices solo se mantienen si los cambios pasan por `add`, `update` y
+`remove`: no modifiques los `Item` devueltos directamente (`update` los
+sustituye por copias, así que los ya devueltos nunca cambian). Cada escritura
+incrementa `version`, que permite cachear lo derivado del inventario
+completo (p. ej. el JSON de `GET /`) hasta el siguiente cambio.
+
+Los artículos se guardan como `ItemRecord`: una clase con `__slots__` y
+los cinco campos, sin `__dict__` ni maquinaria de validación (~9 veces
+menos memoria que un modelo Pydantic y ~5 veces más rápida de crear). El
+modelo Pydantic `Item` de la app valida lo que entra y documenta lo que
+sale; para las respuestas grandes, `RECORDS_JSON` serializa registros
+directamente a JSON sin validarlos.
+
+`InventoryStore` es la interfaz común; `create_inventory()` elige la
+implementación según `INVENTORY_BACKEND`:
+
+    dict        (por defecto) `Inventory`: dict de `Item` + índices
+    columnar    `ColumnarInventory` (`inventory_columnar.py`): arrays NumPy
+
+y, si hay `INVENTORY_DATA_DIR`, lo envuelve en `DurableInventory`
+(`inventory_durable.py`: log de escrituras + snapshots).
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import bisect
+import copy
+import math
+import os
+from abc import abstractmethod
+from array import array
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any, Protocol, TypeVar
+
+from pydantic import TypeAdapter
+
+HASH_FIELDS = ("name", "category", "count")
+
+# Lo que cabe en todos los almacenes (la app valida con esto lo que entra):
+# columnas int64 (columnar, log, snapshots) y nombres con longitud de 16 bits
+# en el log. Son límites de representación, no reglas de negocio.
+INT64_MIN = -(2**63)
+INT64_MAX = 2**63 - 1
+NAME_MAX_LENGTH = 16383  # caracteres: como mucho 65532 bytes en UTF-8
+EMPTY: frozenset[int] = frozenset()
+
+
+class Record(Protocol):
+    """Lo que el inventario necesita de cada artículo (p. ej. `Item`)."""
+
+    id: int
+    name: str
+    price: float
+    count: int
+    category: Any
+
+
+T = TypeVar("T", bound=Record)
+
+
+@dataclass(slots=True)
+class ItemRecord:
+    """Artículo tal como se guarda en memoria: solo los datos."""
+
+    name: str
+    price: float
+    count: int
+    id: int
+    category: Any
+
+    @classmethod
+    def of(cls, item: Record) -> ItemRecord:
+        """Copia los campos de cualquier artículo (p. ej. un `Item` validado)."""
+        return cls(item.name, item.price, item.count, item.id, item.category)
+
+
+# Registros -> JSON en pydantic-core, sin pasar por la validación de `Item`
+RECORD_JSON = TypeAdapter(ItemRecord).dump_json
+RECORDS_JSON = TypeAdapter(list[ItemRecord]).dump_json
+
+Pair = tuple[float, int]  # (price, id)
+
+
+def check_price(price: float) -> float:
+    """
+    Devuelve `price` si es un número finito; si no, `ValueError`. Un NaN no
+    es comparable: rompería el orden de `PriceIndex` (y los montículos de
+    `inventory_stats`) y haría desaparecer otros artículos de los rangos.
+    """
+    if not math.isfinite(price):
+        raise ValueError(f"Invalid price: {price!r}")
+    return price
+
+
+class PriceIndex:
+    """
+    Pares `(price, id)` ordenados, troceados en bloques de ~`load` elementos
+    (la idea de `sortedcontainers.SortedList`). Una lista única obligaría a
+    desplazar N punteros en cada inserción o borrado; así solo se desplaza
+    un bloque y las escrituras no se degradan con el tamaño del inventario.
+    """
+
+    def __init__(self, pairs: Iterable[Pair] = (), load: int = 1000) -> None:
+        self._load = load
+        ordered = sorted(pairs)
+        self._blocks: list[list[Pair]] = [
+            ordered[i : i + load] for i in range(0, len(ordered), load)
+        ]
+        self._maxes: list[Pair] = [block[-1] for block in self._blocks]
+
+    def add(self, pair: Pair) -> None:
+        check_price(pair[0])
+        if not self._blocks:
+            self._blocks, self._maxes = [[pair]], [pair]
+            return
+        i = min(bisect.bisect_left(self._maxes, pair), len(self._maxes) - 1)
+        block = self._blocks[i]
+        bisect.insort(block, pair)
+        self._maxes[i] = block[-1]
+        if len(block) > 2 * self._load:
+            half = block[self._load :]
+            del block[self._load :]
+            self._blocks.insert(i + 1, half)
+            self._maxes[i] = block[-1]
+            self._maxes.insert(i + 1, half[-1])
+
+    def remove(self, pair: Pair) -> None:
+        i = bisect.bisect_left(self._maxes, pair)
+        block = self._blocks[i]
+        del block[bisect.bisect_left(block, pair)]
+        if block:
+            self._maxes[i] = block[-1]
+        else:
+            del self._blocks[i], self._maxes[i]
+
+    def _spans(self, low: float | None, high: float | None) -> Iterator[tuple[list[Pair], int, int]]:
+        """`(bloque, inicio, fin)` de cada tramo con `low <= price <= high`."""
+        if low is not None and high is not None and low > high:
+            return
+        low_key = (-math.inf,) if low is None else (low,)
+        high_key = (math.inf,) if high is None else (high, math.inf)
+        for i in range(bisect.bisect_left(self._maxes, low_key), len(self._blocks)):
+            block = self._blocks[i]
+            start = bisect.bisect_left(block, low_key)
+            stop = bisect.bisect_right(block, high_key)
+            yield block, start, stop
+            if stop < len(block):
+                return
+
+    def count(self, low: float | None, high: float | None) -> int:
+        return sum(stop - start for _, start, stop in self._spans(low, high))
+
+    def ids(self, low: float | None, high: float | None) -> Iterator[int]:
+        for block, start, stop in self._spans(low, high):
+            for _, item_id in block[start:stop]:
+                yield item_id
+
+
+class InventoryStore(Mapping[int, T]):
+    """
+    Interfaz de un inventario: `Mapping` de solo lectura `id -> artículo`
+    más escrituras y consultas por filtros.
+    """
+
+    #: Se incrementa con cada escritura; nunca decrece mientras viva el objeto
+    version: int = 0
+
+    @abstractmethod
+    def add(self, item: T) -> T:
+        """Inserta un artículo nuevo (`KeyError` si el id ya existe)."""
+
+    @abstractmethod
+    def update(self, item_id: int, **changes: Any) -> T:
+        """Modifica campos de un artículo y lo devuelve ya modificado."""
+
+    @abstractmethod
+    def remove(self, item_id: int) -> T:
+        """Elimina y devuelve un artículo (`KeyError` si no existe)."""
+
+    @abstractmethod
+    def query(
+        self,
+        *,
+        name: str | None = None,
+        category: Any = None,
+        count: int | None = None,
+        price: float | None = None,
+        price_min: float | None = None,
+        price_max: float | None = None,
+    ) -> list[T]:
+        """
+        Artículos que cumplen TODOS los filtros dados (los `None` se ignoran),
+        ordenados por `id`.
+        """
+
+    def get_many(self, item_ids: Iterable[int]) -> list[T]:
+        """Los artículos de `item_ids` que existan, en ese orden."""
+        return [self[i] for i in item_ids if i in self]
+
+    def id_snapshot(self) -> Sequence[int]:
+        """Copia compacta (8 bytes por artículo) de los ids actuales."""
+        return array("q", self)
+
+    def iter_chunks(self, size: int = 1000) -> Iterator[list[T]]:
+        """
+        Todos los artículos en listas de `size`, sin construirlos todos a la
+        vez (importa en el backend columnar). Los borrados entretanto no salen.
+        """
+        ids = self.id_snapshot()
+        for start in range(0, len(ids), size):
+            yield self.get_many(ids[start : start + size].tolist())
+
+
+class Inventory(InventoryStore[T]):
+    """`Mapping` de solo lectura `id -> artículo` con índices de consulta."""
+
+    def __init__(self, items: Iterable[T] = ()) -> None:
+        self._items: dict[int, T] = {}
+        self._hash: dict[str, dict[Any, set[int]]] = {field: {} for field in HASH_FIELDS}
+        for item in items:
+            if item.id in self._items:
+                raise KeyError(item.id)
+            check_price(item.price)
+            self._items[item.id] = item
+            self._index_hash(item)
+        # Carga inicial: ordenar una vez en lugar de N inserciones ordenadas
+        self._prices = PriceIndex((item.price, item.id) for item in self._items.values())
+
+    # --- Mapping ---
+
+    def __getitem__(self, item_id: int) -> T:
+        return self._items[item_id]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item_id: object) -> bool:
+        return item_id in self._items
+
+    # --- Escrituras ---
+
+    def add(self, item: T) -> T:
+        if item.id in self._items:
+            raise KeyError(item.id)
+        check_price(item.price)  # antes de tocar ningún índice
+        self._items[item.id] = item
+        self._index(item)
+        self.version += 1
+        return item
+
+    def update(self, item_id: int, **changes: Any) -> T:
+        """
+        Sustituye el artículo por una copia modificada (copy-on-write: quien
+        ya tenía el anterior no ve cambios a medias) y reindexa solo lo que
+        cambia.
+        """
+        old = self._items[item_id]
+        if "price" in changes:
+            check_price(changes["price"])
+        changed = {f: v for f, v in changes.items() if getattr(old, f) != v}
+        item = copy.copy(old)
+        for field, value in changed.items():
+            setattr(item, field, value)
+        hashed = [field for field in HASH_FIELDS if field in changed]
+        for field in hashed:
+            self._unindex_field(old, field)
+            self._index_field(item, field)
+        if "price" in changed:
+            self._unindex_price(old)
+            self._index_price(item)
+        self._items[item_id] = item
+        self.version += 1
+        return item
+
+    def remove(self, item_id: int) -> T:
+        item = self._items.pop(item_id)
+        self._unindex(item)
+        self.version += 1
+        return item
+
+    # --- Consultas ---
+
+    def query(
+        self,
+        *,
+        name: str | None = None,
+        category: Any = None,
+        count: int | None = None,
+        price: float | None = None,
+        price_min: float | None = None,
+        price_max: float | None = None,
+    ) -> list[T]:
+        candidates: list[tuple[int, set[int] | frozenset[int] | None]] = []
+        for field, value in zip(HASH_FIELDS, (name, category, count)):
+            if value is not None:
+                ids = self._hash[field].get(value, EMPTY)
+                candidates.append((len(ids), ids))
+
+        bounds = [b for b in (price, price_min) if b is not None]
+        low = max(bounds) if bounds else None
+        bounds = [b for b in (price, price_max) if b is not None]
+        high = min(bounds) if bounds else None
+        if low is not None or high is not None:
+            candidates.append((self._prices.count(low, high), None))  # None = rango
+
+        if not candidates:
+            return [self._items[i] for i in sorted(self._items)]
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        first = candidates[0][1]
+        result = set(self._prices.ids(low, high) if first is None else first)
+        for _, ids in candidates[1:]:
+            if not result:
+                break
+            if ids is None:
+                # El rango es mayor que lo que queda: comprobar el precio de
+                # cada superviviente sale más barato que materializarlo
+                result = {i for i in result if _in_range(low, self._items[i].price, high)}
+            else:
+                result &= ids  # recorre el menor de los dos conjuntos
+        return [self._items[i] for i in sorted(result)]
+
+    # --- Mantenimiento de índices ---
+
+    def _index_field(self, item: T, field: str) -> None:
+        self._hash[field].setdefault(getattr(item, field), set()).add(item.id)
+
+    def _unindex_field(self, item: T, field: str) -> None:
+        value = getattr(item, field)
+        ids = self._hash[field][value]
+        ids.discard(item.id)
+        if not ids:
+            del self._hash[field][value]
+
+    def _index_hash(self, item: T) -> None:
+        for field in HASH_FIELDS:
+            self._index_field(item, field)
+
+    def _index_price(self, item: T) -> None:
+        self._prices.add((item.price, item.id))
+
+    def _unindex_price(self, item: T) -> None:
+        self._prices.remove((item.price, item.id))
+
+    def _index(self, item: T) -> None:
+        self._index_hash(item)
+        self._index_price(item)
+
+    def _unindex(self, item: T) -> None:
+        for field in HASH_FIELDS:
+            self._unindex_field(item, field)
+        self._unindex_price(item)
+
+
+def _in_range(low: float | None, value: float, high: float | None) -> bool:
+    """`low <= value <= high`, con límites opcionales."""
+    return (low is None or low <= value) and (high is None or value <= high)
+
+
+def create_inventory(
+    items: Iterable[T],
+    factory: Callable[..., T],
+    backend: str | None = None,
+    *,
+    data_dir: str | None = None,
+    category_type: Callable[[str], Any] = str,
+) -> InventoryStore[T]:
+    """
+    Inventario con el backend de `INVENTORY_BACKEND` (`dict` o `columnar`).
+
+    `factory(**campos)` construye un artículo sin validar (lo usan el backend
+    columnar y la recuperación desde disco) y `category_type` convierte la
+    categoría guardada en disco de vuelta a su tipo (p. ej. el `Enum`).
+
+    Con `data_dir` (o `INVENTORY_DATA_DIR`) el inventario es persistente:
+    `items` solo se cargan si el directorio está vacío.
+    """
+    data_dir = data_dir or os.getenv("INVENTORY_DATA_DIR")
+    if data_dir:
+        from inventory_durable import DurableInventory
+
+        return DurableInventory(
+            data_dir,
+            factory,
+            seed=items,
+            category_type=category_type,
+            backend=backend,
+            fsync=os.getenv("INVENTORY_FSYNC", "batch"),
+            fsync_interval=float(os.getenv("INVENTORY_FSYNC_INTERVAL", "0.05")),
+            snapshot_every=int(os.getenv("INVENTORY_SNAPSHOT_EVERY", "100000")),
+        )
+    return memory_inventory(items, factory, backend)
+
+
+def memory_inventory(
+    items: Iterable[T], factory: Callable[..., T], backend: str | None = None
+) -> InventoryStore[T]:
+    """Inventario solo en memoria con el backend pedido (o `INVENTORY_BACKEND`)."""
+    backend = backend or os.getenv("INVENTORY_BACKEND", "dict")
+    if backend == "dict":
+        return Inventory(items)
+    if backend == "columnar":
+        # NumPy solo se importa si se elige este backend
+        from inventory_columnar import ColumnarInventory
+
+        return ColumnarInventory(items, factory)
+    raise ValueError(f"Unknown inventory backend: {backend!r}")
@@ -0,0 +1,174 @@
+"""
+Lotes de cambios para la API de inventario
+==========================================
+
+`POST /items/batch` recibe un array JSON o NDJSON
+(`Content-Type: application/x-ndjson`) de operaciones:
+
+    {"op": "upsert", "item": {...Item...}}            crea o reemplaza
+    {"op": "patch", "id": 3, "count": 10}             como PUT /items/{id}
+    {"op": "delete", "id": 7}                         como DELETE /items/{id}
+
+Cualquiera admite `"if_match"` con el ETag de `GET /items/{id}`. Cada
+elemento se valida por separado (uno mal formado no invalida los demás) y el
+lote se aplica con `ConcurrentInventory.apply`, que pasa por `add` /
+`update` / `remove`: índices y versión del inventario (y con ella la caché
+de `GET /`) quedan al día igual que con los endpoints de un artículo.
+
+Con `atomic=true` basta un elemento inválido o fallido para que no se
+aplique ninguno.
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Annotated, Any, Generic, Literal, TypeVar
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+
+from inventory import INT64_MAX, INT64_MIN, NAME_MAX_LENGTH, ItemRecord
+from inventory_concurrent import Change, ConcurrentInventory, Outcome
+
+I = TypeVar("I", bound=BaseModel)
+
+APPLIED = ("created", "updated", "deleted")
+
+
+class Upsert(BaseModel, Generic[I]):
+    op: Literal["upsert"]
+    item: I
+    if_match: str | None = None
+
+
+class Patch(BaseModel):
+    op: Literal["patch"]
+    id: int
+    name: str | None = Field(None, max_length=NAME_MAX_LENGTH)
+    price: float | None = Field(None, allow_inf_nan=False)
+    count: int | None = Field(None, ge=INT64_MIN, le=INT64_MAX)
+    if_match: str | None = None
+
+
+class Delete(BaseModel):
+    op: Literal["delete"]
+    id: int
+    if_match: str | None = None
+
+
+class BatchItemResult(BaseModel):
+    """Resultado de un elemento del lote (por posición)."""
+    index: int
+    id: int | None = None
+    status: Outcome
+    error: str | None = None
+
+
+class BatchResponse(BaseModel):
+    """Resumen de un lote."""
+    applied: int
+    failed: int
+    atomic: bool
+    results: list[BatchItemResult]
+
+
+BATCH_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"type": "array", "items": {"type": "object"}}},
+            "application/x-ndjson": {"schema": {"type": "string"}},
+        },
+    }
+}
+
+
+async def batch_payload(request: Request) -> list[bytes | object]:
+    """
+    Lee el cuerpo: un array JSON o NDJSON. En NDJSON cada línea se devuelve
+    sin parsear para que una línea mal formada sea un error de ese elemento.
+    """
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        return [line for line in body.splitlines() if line.strip()]
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {exc}")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=422, detail="Expected a JSON array of operations")
+    return payload
+
+
+class BatchParser(Generic[I]):
+    """Valida los elementos de un lote contra el modelo de artículo de la app."""
+
+    def __init__(self, item_type: type[I]) -> None:
+        operation = Annotated[Upsert[item_type] | Patch | Delete, Field(discriminator="op")]
+        self._adapter: TypeAdapter[Upsert[I] | Patch | Delete] = TypeAdapter(operation)
+
+    def parse(
+        self, payload: list[bytes | object], store: ConcurrentInventory
+    ) -> tuple[list[Change], list[BatchItemResult]]:
+        """Los cambios válidos y un resultado por elemento (los inválidos ya marcados)."""
+        changes, results = [], []
+        for index, raw in enumerate(payload):
+            try:
+                if isinstance(raw, bytes):
+                    operation = self._adapter.validate_json(raw)
+                else:
+                    operation = self._adapter.validate_python(raw)
+            except ValidationError as exc:
+                results.append(BatchItemResult(index=index, status="invalid", error=error_message(exc)))
+                continue
+            if_version = store.if_match_versions(operation.if_match)
+            if isinstance(operation, Upsert):
+                record = ItemRecord.of(operation.item)
+                change = Change("upsert", record.id, item=record, if_version=if_version)
+            elif isinstance(operation, Patch):
+                fields = operation.model_dump(include={"name", "price", "count"}, exclude_none=True)
+                if not fields:
+                    results.append(BatchItemResult(
+                        index=index, id=operation.id, status="invalid",
+                        error="No parameters provided for update.",
+                    ))
+                    continue
+                change = Change("patch", operation.id, changes=fields, if_version=if_version)
+            else:
+                change = Change("delete", operation.id, if_version=if_version)
+            changes.append(change)
+            results.append(BatchItemResult(index=index, id=change.item_id, status="skipped"))
+        return changes, results
+
+
+def apply_batch(
+    store: ConcurrentInventory,
+    changes: list[Change],
+    results: list[BatchItemResult],
+    atomic: bool,
+) -> BatchResponse:
+    """Aplica los cambios válidos y completa `results` con lo ocurrido."""
+    invalid = any(result.status == "invalid" for result in results)
+    if not (atomic and invalid):  # atómico con inválidos: todo queda "skipped"
+        pending = [result for result in results if result.status == "skipped"]
+        for result, outcome in zip(pending, store.apply(changes, atomic=atomic)):
+            result.status = outcome
+            result.error = _ERRORS.get(outcome)
+    applied = sum(result.status in APPLIED for result in results)
+    return BatchResponse(
+        applied=applied, failed=len(results) - applied, atomic=atomic, results=results
+    )
+
+
+_ERRORS: dict[str, str] = {
+    "not found": "Item does not exist.",
+    "conflict": "Item was modified (If-Match).",
+    "invalid": "Invalid value for this store.",
+}
+
+
+def error_message(exc: ValidationError) -> str:
+    errors = exc.errors(include_url=False)
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'item'}: {e['msg']}" for e in errors)
@@ -0,0 +1,135 @@
+"""
+Respuestas precodificadas por versión del inventario
+====================================================
+
+`GET /` devuelve el inventario completo. Serializarlo con Pydantic en cada
+petición cuesta O(N) aunque nada haya cambiado, así que `VersionedResponse`
+guarda el cuerpo ya codificado de la `version` actual del inventario (ver
+`inventory.py`) y lo sirve como bytes hasta la siguiente escritura.
+
+Junto al cuerpo se guardan:
+
+*  un ETag fuerte (hash del contenido: vale entre reinicios y entre workers
+   con los mismos datos); con `If-None-Match` coincidente se responde `304`
+   sin serializar ni enviar nada;
+*  la variante gzip, comprimida la primera vez que un cliente la acepta y
+   con su propio ETag (`...-gzip`), como pide HTTP para otra codificación.
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from fastapi import Request, Response
+
+from inventory import InventoryStore
+
+GZIP_MIN_SIZE = 500  # por debajo, gzip apenas ahorra (igual que GZipMiddleware)
+GZIP_LEVEL = 6
+
+
+@dataclass
+class EncodedBody:
+    """Cuerpo codificado de una versión del inventario y sus variantes."""
+
+    version: int
+    body: bytes
+    etag: str
+    _gzip: bytes | None = field(default=None, repr=False)
+
+    @property
+    def gzip_etag(self) -> str:
+        return self.etag[:-1] + '-gzip"'
+
+    @property
+    def gzip(self) -> bytes:
+        if self._gzip is None:  # dos hilos pueden comprimir a la vez: mismo resultado
+            self._gzip = gzip.compress(self.body, GZIP_LEVEL, mtime=0)
+        return self._gzip
+
+
+class VersionedResponse:
+    """Caché de una respuesta que depende de todo el inventario."""
+
+    def __init__(
+        self,
+        store: InventoryStore,
+        encode: Callable[[], bytes],
+        media_type: str = "application/json",
+    ) -> None:
+        self._store = store
+        self._encode = encode
+        self._media_type = media_type
+        self._current: EncodedBody | None = None
+        self._lock = threading.Lock()  # una sola serialización por versión
+
+    def current(self) -> EncodedBody:
+        cached = self._current
+        version = self._store.version
+        if cached is not None and cached.version == version:
+            return cached
+        with self._lock:
+            cached = self._current
+            if cached is not None and cached.version == version:
+                return cached
+            body = self._encode()
+            encoded = EncodedBody(version, body, _etag(body))
+            # Si hubo una escritura mientras se serializaba, el cuerpo puede
+            # mezclar versiones: se sirve, pero no se cachea
+            if self._store.version == version:
+                self._current = encoded
+            return encoded
+
+    def response(self, request: Request) -> Response:
+        encoded = self.current()
+        use_gzip = len(encoded.body) >= GZIP_MIN_SIZE and accepts_gzip(
+            request.headers.get("accept-encoding", "")
+        )
+        etag = encoded.gzip_etag if use_gzip else encoded.etag
+        headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), encoded.etag, encoded.gzip_etag):
+            return Response(status_code=304, headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(encoded.gzip, media_type=self._media_type, headers=headers)
+        return Response(encoded.body, media_type=self._media_type, headers=headers)
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(header: str | None, *etags: str) -> bool:
+    """
+    ¿Coincide `If-None-Match` con alguno de `etags`? Comparación débil
+    (se ignora `W/`), que es la que usa HTTP para esta cabecera.
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return any(etag in candidates for etag in etags)
+
+
+def accepts_gzip(header: str) -> bool:
+    """¿Admite `Accept-Encoding` gzip (y no con `q=0`)?"""
+    for part in header.split(","):
+        coding, *params = part.split(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
@@ -0,0 +1,265 @@
+"""
+Inventario columnar con NumPy
+=============================
+
+Backend opcional de `inventory.py` (`INVENTORY_BACKEND=columnar`) para
+inventarios de millones de artículos. En lugar de un objeto Pydantic por
+artículo guarda una columna tipada por campo:
+
+    id        int64
+    price     float64
+    count     int64
+    category  int8   (código -> valor en `_categories`)
+    name      int32  (código -> nombre internado en `_names`)
+
+Las filas vivas ocupan `[0, len)`: al borrar, la última fila ocupa el hueco,
+así que las columnas no tienen agujeros que saltar (a cambio, tras un
+borrado el orden de iteración ya no es el de inserción). Los filtros de `query`
+son máscaras vectorizadas y los `Item` solo se construyen para las filas
+devueltas. `update_many` aplica cambios a muchas filas en una operación.
+
+Necesita NumPy (viene con pandas, dependencia del proyecto).
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import sys
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+import numpy as np
+
+from inventory import InventoryStore, T, check_price
+
+FIELDS = ("name", "price", "count", "id", "category")
+INITIAL_CAPACITY = 1024
+
+
+class ColumnarInventory(InventoryStore[T]):
+    """Inventario como estructura de arrays (una columna NumPy por campo)."""
+
+    def __init__(self, items: Iterable[T], factory: Callable[..., T]) -> None:
+        self._factory = factory
+        self._names: list[str] = []
+        self._name_codes: dict[str, int] = {}
+        self._categories: list[Any] = []
+        self._category_codes: dict[Any, int] = {}
+        self._rows: dict[int, int] = {}  # id -> fila
+        self._len = 0
+        self._alloc(INITIAL_CAPACITY)
+        for item in items:
+            self.add(item)
+
+    def _alloc(self, capacity: int) -> None:
+        old = getattr(self, "_id", None)
+        columns = {
+            "_id": np.int64,
+            "_price": np.float64,
+            "_count": np.int64,
+            "_category": np.int8,
+            "_name": np.int32,
+        }
+        for attr, dtype in columns.items():
+            column = np.empty(capacity, dtype=dtype)
+            if old is not None:
+                column[: self._len] = getattr(self, attr)[: self._len]
+            setattr(self, attr, column)
+
+    # --- Códigos de name / category ---
+
+    def _name_code(self, name: str, create: bool = True) -> int | None:
+        code = self._name_codes.get(name)
+        if code is None and create:
+            code = self._name_codes[name] = len(self._names)
+            self._names.append(sys.intern(name))
+        return code
+
+    def _category_code(self, category: Any, create: bool = True) -> int | None:
+        code = self._category_codes.get(category)
+        if code is None and create:
+            if len(self._categories) >= np.iinfo(np.int8).max:
+                raise ValueError("Too many categories for an int8 column")
+            code = self._category_codes[category] = len(self._categories)
+            self._categories.append(category)
+        return code
+
+    # --- Mapping ---
+
+    def __getitem__(self, item_id: int) -> T:
+        return self._build(np.array([self._rows[item_id]]))[0]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._id[: self._len].tolist())
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, item_id: object) -> bool:
+        return item_id in self._rows
+
+    def values(self) -> list[T]:  # type: ignore[override]
+        """Todos los artículos, construidos de una vez (no fila a fila)."""
+        return self._build(np.arange(self._len))
+
+    def items(self) -> list[tuple[int, T]]:  # type: ignore[override]
+        return list(zip(self._id[: self._len].tolist(), self.values()))
+
+    def get_many(self, item_ids: Iterable[int]) -> list[T]:
+        rows = self._rows
+        return self._build(np.fromiter((rows[i] for i in item_ids if i in rows), dtype=np.intp))
+
+    def id_snapshot(self) -> np.ndarray:
+        return self._id[: self._len].copy()
+
+    def _build(self, rows: np.ndarray) -> list[T]:
+        """Construye los artículos de `rows` a partir de las columnas."""
+        names, categories = self._names, self._categories
+        return [
+            self._factory(
+                name=names[name], price=price, count=count, id=item_id,
+                category=categories[category],
+            )
+            for item_id, price, count, category, name in zip(
+                self._id[rows].tolist(),
+                self._price[rows].tolist(),
+                self._count[rows].tolist(),
+                self._category[rows].tolist(),
+                self._name[rows].tolist(),
+            )
+        ]
+
+    # --- Escrituras ---
+
+    def add(self, item: T) -> T:
+        if item.id in self._rows:
+            raise KeyError(item.id)
+        check_price(item.price)
+        try:  # antes de escribir nada: fuera de int64 no cabe en la columna
+            item_id, count = np.int64(item.id), np.int64(item.count)
+        except OverflowError:
+            raise ValueError(f"Item {item.id!r} does not fit in int64 columns") from None
+        if self._len == len(self._id):
+            self._alloc(2 * len(self._id))
+        row = self._len
+        self._id[row] = item_id
+        self._price[row] = item.price
+        self._count[row] = count
+        self._category[row] = self._category_code(item.category)
+        self._name[row] = self._name_code(item.name)
+        self._rows[item.id] = row
+        self._len += 1
+        self.version += 1
+        return item
+
+    def update(self, item_id: int, **changes: Any) -> T:
+        row = self._rows[item_id]
+        self._assign(np.array([row]), changes)
+        return self._build(np.array([row]))[0]
+
+    def update_many(self, item_ids: Iterable[int], **columns: Any) -> int:
+        """
+        Asigna los mismos campos a muchos artículos en una operación por
+        columna. Cada valor es un escalar (para todos) o una secuencia
+        alineada con `item_ids`. Devuelve cuántos artículos se modificaron.
+        """
+        rows = np.fromiter((self._rows[i] for i in item_ids), dtype=np.intp)
+        self._assign(rows, columns)
+        return len(rows)
+
+    def _assign(self, rows: np.ndarray, changes: dict[str, Any]) -> None:
+        # Se convierte (y comprueba) cada valor antes de escribir ninguna
+        # columna: uno que no cabe no deja el artículo a medias sin cambiar
+        # `version`
+        columns: list[tuple[np.ndarray, np.ndarray]] = []
+        for field, value in changes.items():
+            if field == "name":
+                if isinstance(value, str):
+                    value = self._name_code(value)
+                else:
+                    value = [self._name_code(v) for v in value]
+            elif field == "category":
+                if isinstance(value, (list, tuple, np.ndarray)):
+                    value = [self._category_code(v) for v in value]
+                else:
+                    value = self._category_code(value)
+            elif field not in ("price", "count"):
+                raise ValueError(f"Field {field!r} cannot be updated")
+            column = getattr(self, f"_{field}")
+            try:
+                value = np.broadcast_to(np.asarray(value, dtype=column.dtype), rows.shape)
+            except OverflowError:
+                raise ValueError(f"{field} does not fit in its column: {value!r}") from None
+            if field == "price" and not np.isfinite(value).all():
+                raise ValueError("Invalid price: NaN or infinite")
+            columns.append((column, value))
+        for column, value in columns:
+            column[rows] = value
+        self.version += 1
+
+    def remove(self, item_id: int) -> T:
+        row = self._rows[item_id]
+        item = self._build(np.array([row]))[0]
+        last = self._len - 1
+        if row != last:
+            for attr in ("_id", "_price", "_count", "_category", "_name"):
+                column = getattr(self, attr)
+                column[row] = column[last]
+            self._rows[int(self._id[row])] = row
+        del self._rows[item_id]
+        self._len = last
+        self.version += 1
+        return item
+
+    # --- Consultas ---
+
+    def query(
+        self,
+        *,
+        name: str | None = None,
+        category: Any = None,
+        count: int | None = None,
+        price: float | None = None,
+        price_min: float | None = None,
+        price_max: float | None = None,
+    ) -> list[T]:
+        n = self._len
+        mask = np.ones(n, dtype=bool)
+        if name is not None:
+            code = self._name_code(name, create=False)
+            if code is None:
+                return []
+            mask &= self._name[:n] == code
+        if category is not None:
+            code = self._category_code(category, create=False)
+            if code is None:
+                return []
+            mask &= self._category[:n] == code
+        if count is not None:
+            mask &= self._count[:n] == count
+        if price is not None:
+            mask &= self._price[:n] == price
+        if price_min is not None:
+            mask &= self._price[:n] >= price_min
+        if price_max is not None:
+            mask &= self._price[:n] <= price_max
+
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(self._id[rows], kind="stable")]
+        return self._build(rows)
+
+    def column(self, field: str) -> np.ndarray:
+        """
+        Vista de solo lectura de una columna de las filas vivas, para
+        agregados vectorizados (`name`/`category` son códigos, ver `labels`).
+        """
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field: {field!r}")
+        view = getattr(self, f"_{field}")[: self._len]
+        view.flags.writeable = False
+        return view
+
+    def labels(self, field: str) -> list[Any]:
+        """Valor de cada código de `name` o `category`."""
+        return list(self._names if field == "name" else self._categories)
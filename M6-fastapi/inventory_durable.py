@@ -0,0 +1,427 @@
+"""
+Inventario persistente: log de escrituras + snapshots
+=====================================================
+
+`DurableInventory` envuelve un `InventoryStore` en memoria (cualquier
+backend) y hace que sobreviva a los reinicios. Ficheros del directorio de
+datos (`INVENTORY_DATA_DIR`):
+
+    inventory.wal    registros PUT/DEL añadidos desde el último snapshot
+    inventory.snap   estado completo en columnas binarias
+
+Cada escritura se valida, se añade al log (write-ahead) y después se aplica
+en memoria. Un registro ocupa ~40 bytes:
+
+    <I longitud><I crc32> <B op><Q seq><q id> [PUT: <d price><q count>
+                                               <H len>name <H len>category]
+
+Cada `snapshot_every` registros se escribe un snapshot compactado: primero
+a un temporal, `fsync` y `os.replace` (atómico), y después se vacía el log.
+El snapshot guarda el `seq` del último registro que incluye, así que si el
+proceso cae entre ambos pasos el arranque simplemente ignora esos registros.
+
+Arranque: el snapshot se abre con `mmap` y sus columnas se leen con
+`memoryview.cast` (sin parsear texto ni copiar el fichero); después solo se
+reproduce la cola del log. Un registro final truncado o con CRC incorrecto
+(escritura interrumpida) marca el final del log y se recorta.
+
+Política de `fsync` (`INVENTORY_FSYNC`):
+
+    always   tras cada escritura: no se pierde nada confirmado
+    batch    como mucho cada `INVENTORY_FSYNC_INTERVAL` s (0.05 por defecto)
+             desde un hilo: si cae la máquina se pierde esa ventana
+    os       nunca: sobrevive a la caída del proceso, no a la de la máquina
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import atexit
+import gc
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+from inventory import InventoryStore, T, check_price, memory_inventory
+
+WAL_NAME = "inventory.wal"
+SNAPSHOT_NAME = "inventory.snap"
+SNAPSHOT_MAGIC = b"INVSNAP1"
+FSYNC_POLICIES = ("always", "batch", "os")
+
+OP_PUT = 1
+OP_DEL = 2
+
+_FRAME = struct.Struct("<II")  # longitud y crc32 del payload
+_HEAD = struct.Struct("<BQq")  # op, seq, id
+_PUT = struct.Struct("<dqHH")  # price, count, len(name), len(category)
+_SNAP_HEADER = struct.Struct("<8sQQII")  # magic, seq, n, n_names, n_categories
+_CRC = struct.Struct("<I")
+
+
+class StoreClosed(Exception):
+    """Escritura en un `DurableInventory` ya cerrado (su log ya no acepta registros)."""
+
+
+def _category_key(category: Any) -> str:
+    return category.value if isinstance(category, Enum) else str(category)
+
+
+def _fields(item: Any) -> dict[str, Any]:
+    return {
+        "name": item.name, "price": item.price, "count": item.count,
+        "id": item.id, "category": item.category,
+    }
+
+
+def _fsync_dir(path: Path) -> None:
+    """Hace duradero un `rename` en `path` (no aplica en Windows)."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class DurableInventory(InventoryStore[T]):
+    """Inventario en memoria con log de escrituras y snapshots en disco."""
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        factory: Callable[..., T],
+        *,
+        seed: Iterable[T] = (),
+        category_type: Callable[[str], Any] = str,
+        backend: str | None = None,
+        fsync: str = "batch",
+        fsync_interval: float = 0.05,
+        snapshot_every: int = 100_000,
+    ) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync!r}")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self._factory = factory
+        self._category_type = category_type
+        self._lock = threading.Lock()
+        self._dirty = False  # escrito pero sin fsync (política `batch`)
+        self._closed = threading.Event()
+
+        # --- Recuperación ---
+        # Se crean millones de objetos que no son basura: sin pausar el GC,
+        # sus pasadas sobre ellos encarecen la carga ~1.5x
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            self._seq, rows = self._read_snapshot()
+            self._store: InventoryStore[T] = memory_inventory(rows, factory, backend)
+            loaded = time.perf_counter()
+            replayed = self._replay_wal()
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.recovery = {
+            "snapshot s": loaded - start,
+            "replay s": time.perf_counter() - loaded,
+            "replayed": replayed,
+        }
+
+        self._wal = open(self.path / WAL_NAME, "ab")
+        self._wal_records = replayed
+        if self._seq == 0:  # directorio nuevo: datos iniciales
+            for item in seed:
+                self.add(item)
+
+        if fsync == "batch":
+            threading.Thread(target=self._sync_loop, name="inventory-fsync", daemon=True).start()
+        atexit.register(self.close)
+
+    # --- Lecturas: directas al inventario en memoria ---
+
+    def __getitem__(self, item_id: int) -> T:
+        return self._store[item_id]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._store)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __contains__(self, item_id: object) -> bool:
+        return item_id in self._store
+
+    def values(self):  # type: ignore[override]
+        return self._store.values()
+
+    def items(self):  # type: ignore[override]
+        return self._store.items()
+
+    def query(self, **filters: Any) -> list[T]:
+        return self._store.query(**filters)
+
+    def get_many(self, item_ids: Iterable[int]) -> list[T]:
+        return self._store.get_many(item_ids)
+
+    def id_snapshot(self) -> Sequence[int]:
+        return self._store.id_snapshot()
+
+    @property
+    def version(self) -> int:  # type: ignore[override]
+        return self._store.version
+
+    # --- Escrituras: validar, registrar en el log, aplicar ---
+
+    def add(self, item: T) -> T:
+        with self._lock:
+            self._check_open()
+            if item.id in self._store:
+                raise KeyError(item.id)
+            check_price(item.price)  # un NaN en el log rompería cada arranque
+            self._append(OP_PUT, item.id, _fields(item))
+            self._store.add(item)
+            self._maybe_snapshot()
+        return item
+
+    def update(self, item_id: int, **changes: Any) -> T:
+        with self._lock:
+            self._check_open()
+            # El registro lleva el artículo completo ya modificado (un PUT)
+            fields = _fields(self._store[item_id]) | changes
+            check_price(fields["price"])
+            self._append(OP_PUT, item_id, fields)
+            item = self._store.update(item_id, **changes)
+            self._maybe_snapshot()
+        return item
+
+    def remove(self, item_id: int) -> T:
+        with self._lock:
+            self._check_open()
+            if item_id not in self._store:
+                raise KeyError(item_id)
+            self._append(OP_DEL, item_id)
+            item = self._store.remove(item_id)
+            self._maybe_snapshot()
+        return item
+
+    def _check_open(self) -> None:
+        # Sin esto, escribir en el log cerrado daría un `ValueError` que un
+        # lote (`ConcurrentInventory.apply`) tomaría por un artículo inválido
+        if self._wal.closed:
+            raise StoreClosed(f"Inventory store {self.path} is closed")
+
+    def _append(self, op: int, item_id: int, fields: dict[str, Any] | None = None) -> None:
+        # Codificar antes de tocar nada: lo que no cabe en el registro (id o
+        # count fuera de int64, textos de más de 65535 bytes) es `ValueError`
+        # y no consume `seq`
+        try:
+            payload = _HEAD.pack(op, self._seq + 1, item_id)
+            if op == OP_PUT:
+                name = fields["name"].encode()
+                category = _category_key(fields["category"]).encode()
+                payload += _PUT.pack(fields["price"], fields["count"], len(name), len(category))
+                payload += name + category
+        except struct.error as exc:
+            raise ValueError(f"Item {item_id!r} does not fit in a log record: {exc}") from None
+        self._seq += 1
+        self._wal.write(_FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._wal.flush()  # al SO: ya sobrevive a la caída del proceso
+        if self.fsync == "always":
+            os.fsync(self._wal.fileno())
+        else:
+            self._dirty = True
+        self._wal_records += 1
+
+    def _sync_loop(self) -> None:
+        """Política `batch`: un `fsync` por ventana agrupa todas sus escrituras."""
+        while not self._closed.wait(self.fsync_interval):
+            # El fsync (milisegundos) va fuera del lock, sobre un duplicado
+            # del descriptor: las escrituras siguen entretanto y se marcan
+            # como pendientes para la próxima ventana
+            with self._lock:
+                if not self._dirty or self._wal.closed:
+                    continue
+                fd = os.dup(self._wal.fileno())
+                self._dirty = False
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    # --- Snapshots ---
+
+    def _maybe_snapshot(self) -> None:
+        if self._wal_records >= self.snapshot_every:
+            self._snapshot()
+
+    def snapshot(self) -> None:
+        """Escribe un snapshot compactado y vacía el log."""
+        with self._lock:
+            self._snapshot()
+
+    def _snapshot(self) -> None:
+        ids, prices, counts = array("q"), array("d"), array("q")
+        name_codes, category_codes = array("i"), array("B")
+        names: dict[str, int] = {}
+        categories: dict[str, int] = {}
+        for item in self._store.values():
+            ids.append(item.id)
+            prices.append(item.price)
+            counts.append(item.count)
+            name_codes.append(names.setdefault(item.name, len(names)))
+            category_codes.append(
+                categories.setdefault(_category_key(item.category), len(categories))
+            )
+        name_blobs = [name.encode() for name in names]
+        category_blobs = [category.encode() for category in categories]
+        chunks = [
+            _SNAP_HEADER.pack(SNAPSHOT_MAGIC, self._seq, len(ids), len(names), len(categories)),
+            ids, prices, counts, name_codes, category_codes,
+            array("I", map(len, name_blobs)), array("I", map(len, category_blobs)),
+            b"".join(name_blobs), b"".join(category_blobs),
+        ]
+
+        tmp = self.path / (SNAPSHOT_NAME + ".tmp")
+        with open(tmp, "wb") as f:
+            crc = 0
+            for chunk in chunks:
+                f.write(chunk)
+                crc = zlib.crc32(chunk, crc)
+            f.write(_CRC.pack(crc))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path / SNAPSHOT_NAME)
+        _fsync_dir(self.path)
+
+        # Lo anterior al snapshot ya no hace falta (y si el vaciado no llega
+        # a disco, el arranque ignora los registros con `seq` ya incluido)
+        self._wal.truncate(0)
+        if self.fsync != "os":
+            os.fsync(self._wal.fileno())
+        self._wal_records = 0
+        self._dirty = False
+
+    def _read_snapshot(self) -> tuple[int, Iterator[T]]:
+        """`(seq, artículos)` del snapshot, o `(0, vacío)` si no hay ninguno."""
+        path = self.path / SNAPSHOT_NAME
+        if not path.exists():
+            return 0, iter(())
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        body = view[: -_CRC.size]
+        magic, seq, n, n_names, n_categories = _SNAP_HEADER.unpack_from(body)
+        if magic != SNAPSHOT_MAGIC or _CRC.unpack_from(view, len(body))[0] != zlib.crc32(body):
+            body.release()
+            view.release()
+            mm.close()
+            raise ValueError(f"Corrupt inventory snapshot: {path}")
+
+        def rows() -> Iterator[T]:
+            offset = _SNAP_HEADER.size
+            columns = []
+            try:
+                for code, size, length in (
+                    ("q", 8, n), ("d", 8, n), ("q", 8, n), ("i", 4, n), ("B", 1, n),
+                    ("I", 4, n_names), ("I", 4, n_categories),
+                ):
+                    columns.append(body[offset : offset + size * length].cast(code))
+                    offset += size * length
+                ids, prices, counts, name_codes, category_codes, name_lens, category_lens = columns
+                names = []
+                for length in name_lens:
+                    names.append(bytes(body[offset : offset + length]).decode())
+                    offset += length
+                categories = []
+                for length in category_lens:
+                    key = bytes(body[offset : offset + length]).decode()
+                    categories.append(self._category_type(key))
+                    offset += length
+
+                factory = self._factory
+                for item_id, price, count, name, category in zip(
+                    ids, prices, counts, name_codes, category_codes
+                ):
+                    yield factory(
+                        name=names[name], price=price, count=count, id=item_id,
+                        category=categories[category],
+                    )
+            finally:
+                for column in columns:
+                    column.release()
+                body.release()
+                view.release()
+                mm.close()
+
+        return seq, rows()
+
+    def _replay_wal(self) -> int:
+        """Aplica los registros posteriores al snapshot; recorta una cola rota."""
+        path = self.path / WAL_NAME
+        if not path.exists():
+            return 0
+        data = path.read_bytes()
+        view = memoryview(data)
+        position = replayed = 0
+        while position + _FRAME.size <= len(data):
+            length, crc = _FRAME.unpack_from(data, position)
+            end = position + _FRAME.size + length
+            payload = view[position + _FRAME.size : end]
+            if end > len(data) or zlib.crc32(payload) != crc:
+                break
+            op, seq, item_id = _HEAD.unpack_from(payload)
+            if seq > self._seq:
+                if op == OP_PUT:
+                    self._apply_put(item_id, payload)
+                else:
+                    self._store.remove(item_id)
+                self._seq = seq
+                replayed += 1
+            position = end
+        if position < len(data):
+            with open(path, "r+b") as f:
+                f.truncate(position)
+        return replayed
+
+    def _apply_put(self, item_id: int, payload: memoryview) -> None:
+        price, count, name_len, category_len = _PUT.unpack_from(payload, _HEAD.size)
+        offset = _HEAD.size + _PUT.size
+        name = bytes(payload[offset : offset + name_len]).decode()
+        offset += name_len
+        category = self._category_type(bytes(payload[offset : offset + category_len]).decode())
+        if item_id in self._store:
+            self._store.update(item_id, name=name, price=price, count=count, category=category)
+        else:
+            self._store.add(self._factory(
+                name=name, price=price, count=count, id=item_id, category=category,
+            ))
+
+    # --- Cierre ---
+
+    def close(self, snapshot: bool = True) -> None:
+        """Vuelca el log a disco (y compacta en un snapshot si hay registros)."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        with self._lock:
+            if snapshot and self._wal_records:
+                self._snapshot()
+            if self.fsync != "os":
+                os.fsync(self._wal.fileno())
+            self._wal.close()
+        atexit.unregister(self.close)
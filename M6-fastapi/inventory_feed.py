@@ -0,0 +1,178 @@
+"""
+Feed de cambios del inventario por Server-Sent Events
+=====================================================
+
+`GET /items/changes` mantiene abierta la respuesta (`text/event-stream`) y
+envía un evento por cada escritura del inventario:
+
+    event: added | updated | deleted
+    id: <epoch>.<seq>
+    data: {"seq": 41, "id": 3, "item": {...}}      (deleted: sin "item")
+
+`ConcurrentInventory` publica los eventos al terminar cada escritura, aún
+dentro del lock de escritura: los números de secuencia siguen el orden real
+de los cambios. Un lote publica todos sus eventos juntos y uno atómico que
+se deshace no publica ninguno.
+
+*  Reanudar: el navegador reenvía el último `id` en `Last-Event-ID` (o se
+   pasa `?since=<seq>`) y el feed continúa desde ahí si ese evento sigue en
+   el *ring buffer* (los últimos `capacity` eventos).
+*  Si ya no está, o el `id` es de otro arranque del proceso (`epoch`, como
+   en los ETag de `inventory_concurrent.py`), se envía `event: reset` con la
+   secuencia actual: el cliente debe releer `GET /` y seguir desde ahí.
+*  Los consumidores lentos no frenan a los escritores: publicar es escribir
+   en una posición del anillo y, como mucho, programar un aviso al *event
+   loop*; no hay una cola por suscriptor. Cada suscriptor lleva su cursor y
+   si el anillo le da la vuelta recibe `reset`.
+*  Cada evento se codifica una vez (la primera vez que alguien lo lee) y
+   todos los suscriptores envían los mismos bytes.
+
+Un proceso, un feed: con varios workers cada uno tiene su inventario y sus
+secuencias.
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import asyncio
+import secrets
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from inventory import RECORD_JSON
+
+FEED_CAPACITY = 10_000
+KEEPALIVE_SECONDS = 15.0
+MAX_FRAMES_PER_CHUNK = 500  # al ponerse al día, varios eventos por envío
+
+EventType = Literal["added", "updated", "deleted"]
+
+
+@dataclass(slots=True)
+class FeedEvent:
+    """Un cambio publicado; `frame` es su codificación SSE."""
+
+    epoch: bytes
+    seq: int
+    type: EventType
+    item_id: int
+    item: Any = None  # el artículo tras el cambio (None al borrar)
+    _frame: bytes | None = None
+
+    @property
+    def frame(self) -> bytes:
+        if self._frame is None:
+            data = b'{"seq":%d,"id":%d' % (self.seq, self.item_id)
+            if self.item is not None:
+                data += b',"item":' + RECORD_JSON(self.item)
+            self._frame = b"event: %s\nid: %s.%d\ndata: %s}\n\n" % (
+                self.type.encode(), self.epoch, self.seq, data
+            )
+        return self._frame
+
+
+class ChangeFeed:
+    """Los últimos `capacity` cambios, en un anillo, y aviso a los suscriptores."""
+
+    def __init__(self, capacity: int = FEED_CAPACITY) -> None:
+        self.capacity = capacity
+        self.epoch = secrets.token_hex(4)
+        self._ring: list[FeedEvent | None] = [None] * capacity
+        self.last_seq = 0  # secuencia del último evento publicado
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._changed = asyncio.Event()
+        self._notify_pending = False
+
+    # --- Escritores (cualquier hilo, con el lock del inventario) ---
+
+    def publish(self, changes: Iterable[tuple[EventType, int, Any]]) -> None:
+        """Añade los cambios al anillo y avisa al *event loop*; no espera a nadie."""
+        seq, epoch = self.last_seq, self.epoch.encode()
+        for event_type, item_id, item in changes:
+            seq += 1
+            self._ring[seq % self.capacity] = FeedEvent(epoch, seq, event_type, item_id, item)
+        self.last_seq = seq  # visible solo cuando el anillo ya está escrito
+        loop = self._loop
+        if loop is not None and not self._notify_pending:
+            # Muchas escrituras seguidas se avisan con una sola llamada
+            self._notify_pending = True
+            try:
+                loop.call_soon_threadsafe(self._notify)
+            except RuntimeError:  # loop cerrado
+                self._loop = None
+
+    def _notify(self) -> None:
+        self._notify_pending = False
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    # --- Suscriptores (en el event loop) ---
+
+    def since(self, cursor: int) -> list[FeedEvent] | None:
+        """Eventos con secuencia > `cursor`; `None` si alguno ya salió del anillo."""
+        last = self.last_seq
+        if cursor > last or last - cursor > self.capacity:
+            return None
+        events = []
+        for seq in range(cursor + 1, last + 1):
+            event = self._ring[seq % self.capacity]
+            if event is None or event.seq != seq:  # sobrescrito mientras se leía
+                return None
+            events.append(event)
+        return events
+
+    def _bind(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:  # primer suscriptor (o un loop nuevo)
+            self._loop = loop
+            self._changed = asyncio.Event()
+            self._notify_pending = False
+
+    async def stream(
+        self, since: int | None = None, keepalive: float = KEEPALIVE_SECONDS
+    ) -> AsyncIterator[bytes]:
+        """
+        Los eventos posteriores a `since` (por defecto, desde ahora) en
+        formato SSE, indefinidamente.
+        """
+        self._bind()
+        cursor = self.last_seq if since is None else since
+        if since is not None and (since < 0 or self.since(cursor) is None):
+            yield self._reset()
+            cursor = self.last_seq
+        else:
+            yield b": connected\n\n"  # que el cliente vea la respuesta ya
+        while True:
+            changed = self._changed  # antes de mirar: no se pierde ningún aviso
+            events = self.since(cursor)
+            if events is None:  # el anillo nos ha dado la vuelta
+                yield self._reset()
+                cursor = self.last_seq
+            elif events:
+                for start in range(0, len(events), MAX_FRAMES_PER_CHUNK):
+                    chunk = events[start : start + MAX_FRAMES_PER_CHUNK]
+                    yield b"".join([event.frame for event in chunk])
+                cursor = events[-1].seq
+            else:
+                try:
+                    await asyncio.wait_for(changed.wait(), keepalive)
+                except TimeoutError:
+                    yield b": keepalive\n\n"
+
+    def _reset(self) -> bytes:
+        seq = self.last_seq
+        return b'event: reset\nid: %s.%d\ndata: {"seq":%d}\n\n' % (self.epoch.encode(), seq, seq)
+
+    def resume_point(self, last_event_id: str | None, since: int | None) -> int | None:
+        """
+        Secuencia desde la que seguir: la de `Last-Event-ID` (reconexión) o
+        `?since=`; -1 si el `id` es de otro arranque (se responderá `reset`).
+        """
+        if last_event_id is None:
+            return since
+        epoch, _, seq = last_event_id.strip().partition(".")
+        if epoch != self.epoch or not seq.isdigit():
+            return -1
+        return int(seq)
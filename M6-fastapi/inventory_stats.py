@@ -0,0 +1,157 @@
+"""
+Agregados por categoría mantenidos incrementalmente
+===================================================
+
+`InventoryStats` lleva, por categoría, número de artículos, unidades
+(`count`), valor del stock (`price × count`) y precio mínimo y máximo.
+`ConcurrentInventory` lo actualiza en cada `add` / `update` / `remove`, así
+que `GET /items/stats` no recorre el inventario:
+
+*  Totales: sumas y restas O(1). El valor es un `float` con suma compensada
+   (Neumaier) para que millones de altas y bajas no acumulen error; al
+   vaciarse una categoría se descarta y vuelve a empezar desde cero.
+*  Mínimo / máximo: un montículo de precios para cada extremo con borrado
+   perezoso. Un `Counter` dice qué precios siguen vivos; los muertos se
+   descartan al llegar a la cima (O(log n) amortizado) y, si los montículos
+   acumulan demasiada basura, se reconstruyen desde el `Counter`.
+
+`recompute()` calcula lo mismo recorriendo todos los artículos, para
+comprobar que lo mantenido no se ha desviado.
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+from collections import Counter
+from collections.abc import Iterable
+from typing import Any, TypedDict
+
+from inventory import Record
+
+
+class Stats(TypedDict):
+    count: int
+    units: int
+    stock_value: float
+    min_price: float
+    max_price: float
+
+
+class CategoryAggregate:
+    """Agregados de una categoría."""
+
+    __slots__ = ("count", "units", "_value", "_compensation", "_live", "_low", "_high")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.units = 0
+        self._value = 0.0
+        self._compensation = 0.0
+        self._live: Counter[float] = Counter()  # precio -> artículos con ese precio
+        self._low: list[float] = []  # montículo de mínimos
+        self._high: list[float] = []  # montículo de máximos (precios negados)
+
+    def add(self, price: float, count: int) -> None:
+        self.count += 1
+        self.units += count
+        self._add_value(price * count)
+        if self._live[price] == 0:
+            heapq.heappush(self._low, price)
+            heapq.heappush(self._high, -price)
+        self._live[price] += 1
+
+    def remove(self, price: float, count: int) -> None:
+        self.count -= 1
+        self.units -= count
+        self._add_value(-price * count)
+        self._live[price] -= 1
+        if not self._live[price]:
+            del self._live[price]  # sale de los montículos al llegar a la cima
+            if len(self._low) > 2 * len(self._live) + 32:
+                self._low = list(self._live)
+                heapq.heapify(self._low)
+                self._high = [-price for price in self._live]
+                heapq.heapify(self._high)
+
+    def _add_value(self, x: float) -> None:
+        total = self._value + x
+        if abs(self._value) >= abs(x):
+            self._compensation += (self._value - total) + x
+        else:
+            self._compensation += (x - total) + self._value
+        self._value = total
+
+    @property
+    def stock_value(self) -> float:
+        return self._value + self._compensation
+
+    @property
+    def min_price(self) -> float:
+        while self._low[0] not in self._live:
+            heapq.heappop(self._low)
+        return self._low[0]
+
+    @property
+    def max_price(self) -> float:
+        while -self._high[0] not in self._live:
+            heapq.heappop(self._high)
+        return -self._high[0]
+
+    def as_dict(self) -> Stats:
+        return {
+            "count": self.count,
+            "units": self.units,
+            "stock_value": self.stock_value,
+            "min_price": self.min_price,
+            "max_price": self.max_price,
+        }
+
+
+class InventoryStats:
+    """Agregados de todo el inventario, por categoría."""
+
+    def __init__(self, items: Iterable[Record] = ()) -> None:
+        self._categories: dict[Any, CategoryAggregate] = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item: Record) -> None:
+        aggregate = self._categories.get(item.category)
+        if aggregate is None:
+            aggregate = self._categories[item.category] = CategoryAggregate()
+        aggregate.add(item.price, item.count)
+
+    def remove(self, item: Record) -> None:
+        aggregate = self._categories[item.category]
+        aggregate.remove(item.price, item.count)
+        if not aggregate.count:
+            del self._categories[item.category]
+
+    def snapshot(self) -> dict[Any, Stats]:
+        """Agregados de las categorías con algún artículo."""
+        return {category: aggregate.as_dict() for category, aggregate in self._categories.items()}
+
+
+def recompute(items: Iterable[Record]) -> dict[Any, Stats]:
+    """Los mismos agregados que `InventoryStats.snapshot`, con una pasada completa."""
+    values: dict[Any, list[float]] = {}
+    stats: dict[Any, Stats] = {}
+    for item in items:
+        row = stats.get(item.category)
+        if row is None:
+            row = stats[item.category] = {
+                "count": 0, "units": 0, "stock_value": 0.0,
+                "min_price": math.inf, "max_price": -math.inf,
+            }
+            values[item.category] = []
+        row["count"] += 1
+        row["units"] += item.count
+        values[item.category].append(item.price * item.count)
+        row["min_price"] = min(row["min_price"], item.price)
+        row["max_price"] = max(row["max_price"], item.price)
+    for category, row in stats.items():
+        row["stock_value"] = math.fsum(values[category])
+    return stats
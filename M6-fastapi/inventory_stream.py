@@ -0,0 +1,128 @@
+"""
+Exportación e importación del inventario en NDJSON
+==================================================
+
+`GET /items/export` emite un artículo por línea sin construir el documento
+completo: se copia la lista de ids (8 bytes por artículo) y se leen, se
+serializan y se envían bloques de `EXPORT_CHUNK` artículos. Cada bloque es
+una lectura consistente; el conjunto no es una instantánea (un artículo
+borrado durante la exportación no sale, uno creado después tampoco).
+
+`POST /items/import` lee el cuerpo según llega (`request.stream()`, sirve
+con `Transfer-Encoding: chunked`), corta líneas y, cada `batch_size`
+líneas, las valida e inserta (upsert) con `ConcurrentInventory.apply` en el
+*threadpool*. En memoria solo hay un lote: el tamaño de la subida no
+importa. Cada lote se aplica al completarse, así que si la subida se corta
+quedan aplicados los lotes anteriores.
+
+Validación: cada línea por separado con pydantic-core. Unir el lote en un
+array JSON y validarlo de una vez no es más rápido, y una línea partida o
+con dos objetos podría formar un array válido.
+
+---------------------
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import Generic, TypeVar
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from inventory import RECORD_JSON, ItemRecord
+from inventory_batch import error_message
+from inventory_concurrent import Change, ConcurrentInventory
+
+I = TypeVar("I", bound=BaseModel)
+
+EXPORT_CHUNK = 1000
+IMPORT_BATCH_DEFAULT = 5000
+IMPORT_BATCH_MAX = 100_000
+MAX_LINE_BYTES = 1 << 20
+MAX_REPORTED_ERRORS = 100
+
+
+class LineError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportResponse(BaseModel):
+    """Resumen de una importación."""
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: list[LineError] = []  # las primeras `MAX_REPORTED_ERRORS`
+
+
+IMPORT_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/x-ndjson": {"schema": {"type": "string"}}},
+    }
+}
+
+
+def iter_ndjson(store: ConcurrentInventory[ItemRecord]) -> Iterator[bytes]:
+    """Todo el inventario como NDJSON, en bloques de `EXPORT_CHUNK` artículos."""
+    for chunk in store.iter_chunks(EXPORT_CHUNK):
+        yield b"".join([RECORD_JSON(record) + b"\n" for record in chunk])
+
+
+class NdjsonImporter(Generic[I]):
+    """Importa NDJSON del modelo de artículo de la app, por lotes."""
+
+    def __init__(self, item_type: type[I]) -> None:
+        self._one = TypeAdapter(item_type)
+
+    async def run(
+        self, request: Request, store: ConcurrentInventory, batch_size: int
+    ) -> ImportResponse:
+        result = ImportResponse()
+        lines: list[bytes] = []
+        first_line = 1  # número de línea de `lines[0]`
+        rest = b""
+        async for chunk in request.stream():
+            *complete, rest = (rest + chunk).split(b"\n")
+            if len(rest) > MAX_LINE_BYTES:
+                raise HTTPException(status_code=413, detail="NDJSON line too long")
+            lines += complete
+            if len(lines) >= batch_size:
+                await run_in_threadpool(self._flush, lines, first_line, store, result)
+                first_line += len(lines)
+                lines = []
+        if rest:
+            lines.append(rest)
+        if lines:
+            await run_in_threadpool(self._flush, lines, first_line, store, result)
+        return result
+
+    def _flush(
+        self, lines: list[bytes], first_line: int, store: ConcurrentInventory, result: ImportResponse
+    ) -> None:
+        numbered = [(first_line + i, line) for i, line in enumerate(lines) if line.strip()]
+        valid = []
+        for number, line in numbered:
+            try:
+                valid.append((number, self._one.validate_json(line)))
+            except ValidationError as exc:
+                self._error(result, number, error_message(exc))
+
+        outcomes = store.apply(
+            [Change("upsert", item.id, item=ItemRecord.of(item)) for _, item in valid]
+        )
+        for (number, _), outcome in zip(valid, outcomes):
+            if outcome == "created":
+                result.created += 1
+            elif outcome == "updated":
+                result.updated += 1
+            else:
+                self._error(result, number, outcome)
+
+    @staticmethod
+    def _error(result: ImportResponse, line: int, message: str) -> None:
+        result.failed += 1
+        if len(result.errors) < MAX_REPORTED_ERRORS:
+            result.errors.append(LineError(line=line, error=message))
@@ -0,0 +1,122 @@
+"""
+Single-flight: agrupar consultas idénticas concurrentes
+=======================================================
+
+Si cien peticiones piden a la vez el mismo libro, solo la primera (el *líder*)
+consulta la BD; las demás esperan y reciben su mismo resultado (o excepción).
+Así un pico sobre una clave caliente cuesta un `SELECT` y una conexión del
+pool en lugar de cien.
+
+*  `SingleFlight`      → handlers `def` que corren en el threadpool.
+*  `AsyncSingleFlight` → handlers `async def` en el event loop.
+
+`FlightStats.shared` cuenta las llamadas que se ahorraron la consulta.
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class FlightStats:
+    """Contadores acumulados desde el arranque."""
+
+    calls: int = 0       # llamadas a `do`
+    executions: int = 0  # veces que realmente se ejecutó la función
+    shared: int = 0      # llamadas que reutilizaron una ejecución en vuelo
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+class _Call:
+    """Una ejecución en vuelo compartida entre hilos."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave (versión con hilos)."""
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.stats = FlightStats()
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        if not self.enabled:
+            self.stats.calls += 1
+            self.stats.executions += 1
+            return fn()
+
+        with self._lock:
+            self.stats.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats.executions += 1
+            else:
+                self.stats.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave (versión asyncio).
+
+    La ejecución compartida es una `Task` independiente y cada llamada la
+    espera con `asyncio.shield`: si el cliente del líder se desconecta, su
+    cancelación no aborta la consulta que esperan los demás.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.stats = FlightStats()
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self.stats.calls += 1
+        if not self.enabled:
+            self.stats.executions += 1
+            return await fn()
+
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            self.stats.executions += 1
+        else:
+            self.stats.shared += 1
+        return await asyncio.shield(task)
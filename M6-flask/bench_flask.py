@@ -0,0 +1,589 @@
+"""
+Benchmarks de la API Flask de libros (`app_flask.py`)
+======================================================
+
+Cada subcomando trabaja contra una BD SQLite temporal; la app se configura
+por entorno (`DATABASE_URL`...) igual que en producción.
+
+    python bench_flask.py startup      # import en frío -> primera respuesta
+    python bench_flask.py replicas     # reparto entre réplicas y read-your-writes
+    python bench_flask.py list         # GET /books/ en streaming: memoria a 1M filas
+    python bench_flask.py http         # ETag / 304 y gzip cacheado por versión
+    python bench_flask.py serve        # serve.py: req/s por workers, caídas y recarga
+    python bench_flask.py mget         # POST /books/_mget frente a N GET /books/<id>
+    python bench_flask.py profile      # coste del perfilado, apagado y encendido
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import shutil
+import signal
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+
+# --------------------------------------------------------------------------- #
+#               Utilidades                                                    #
+# --------------------------------------------------------------------------- #
+
+def seed_sqlite(path: Path, rows: int) -> list[str]:
+    """
+    Crea `books`, `table_versions` y su trigger en un fichero SQLite y puebla
+    `books` con `rows` libros.
+    """
+    from app_flask import VERSION_TRIGGERS
+
+    ids = [secrets.token_hex(12) for _ in range(rows)]
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS books ("
+            " id VARCHAR(24) PRIMARY KEY, title VARCHAR(255) NOT NULL,"
+            " author VARCHAR(255) NOT NULL, pages INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS table_versions ("
+            " name VARCHAR(64) PRIMARY KEY, version INTEGER NOT NULL, changed_at FLOAT NOT NULL)"
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO table_versions VALUES ('books', 0, ?)", (time.time(),)
+        )
+        conn.executemany(
+            "INSERT INTO books VALUES (?, ?, ?, ?)",
+            ((id_, f"Book {i}", f"Author {i % 100}", i % 1000) for i, id_ in enumerate(ids)),
+        )
+        # Después de la carga: la semilla no necesita subir la versión fila a fila
+        conn.execute(VERSION_TRIGGERS["sqlite"])
+    return ids
+
+
+def print_table(rows: dict[str, dict[str, float]]) -> None:
+    columns = {c: max(12, len(c) + 2) for c in next(iter(rows.values()))}
+    print(f"{'':>12}" + "".join(f"{c:>{w}}" for c, w in columns.items()))
+    for name, metrics in rows.items():
+        print(f"{name:>12}" + "".join(f"{metrics[c]:>{w}.1f}" for c, w in columns.items()))
+
+
+# --------------------------------------------------------------------------- #
+#               Subcomandos                                                   #
+# --------------------------------------------------------------------------- #
+
+STARTUP_CHILD = """
+import time
+t0 = time.perf_counter()
+import json
+import app_flask
+t1 = time.perf_counter()
+app = app_flask.create_app()
+t2 = time.perf_counter()
+assert app.test_client().get("/books/").status_code == 200
+t3 = time.perf_counter()
+print(json.dumps({
+    "import ms": (t1 - t0) * 1000,
+    "startup ms": (t2 - t1) * 1000,
+    "1st req ms": (t3 - t2) * 1000,
+}))
+"""
+
+
+def bench_startup(args: argparse.Namespace) -> None:
+    """Import en frío hasta la primera respuesta, con y sin comprobar el esquema."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        seed_sqlite(db_path, 1_000)
+        results = {}
+        for skip in ("0", "1"):
+            env = {
+                **os.environ,
+                "DATABASE_URL": f"sqlite:///{db_path}",
+                "DB_SKIP_SCHEMA_CHECK": skip,
+            }
+            runs = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                out = subprocess.run(
+                    [sys.executable, "-c", STARTUP_CHILD],
+                    cwd=HERE, env=env, check=True, capture_output=True, text=True,
+                ).stdout
+                runs.append({
+                    **json.loads(out.splitlines()[-1]),
+                    "process ms": (time.perf_counter() - start) * 1000,
+                })
+            name = "skip schema" if skip == "1" else "create_all"
+            results[name] = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+    print_table(results)
+
+
+def check_replicas(args: argparse.Namespace) -> None:
+    """
+    Reparto de lecturas entre réplicas y read-your-writes, con un fichero
+    SQLite por nodo. Las "réplicas" son copias que nunca se actualizan: un
+    libro recién creado solo existe en el primario.
+    """
+    from sqlalchemy import event
+
+    from app_flask import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        primary = Path(tmp) / "primary.db"
+        ids = seed_sqlite(primary, args.requests)
+        replicas = [Path(tmp) / f"replica{i}.db" for i in (1, 2)]
+        for replica in replicas:
+            shutil.copy(primary, replica)
+        results = {}
+        for policy in ("round_robin", "least_connections"):
+            app = create_app({
+                "DATABASE_URL": f"sqlite:///{primary}",
+                "DATABASE_REPLICA_URLS": [f"sqlite:///{r}" for r in replicas],
+                "DB_REPLICA_POLICY": policy,
+                "DB_READ_YOUR_WRITES": 1.0,
+            })
+            selects = {}
+            engines = app.extensions["books.router"].engines
+            for name, engine in zip(("primary", "replica1", "replica2"), engines):
+                selects[name] = 0
+                event.listen(  # solo las lecturas de libros, no la de `table_versions`
+                    engine, "before_cursor_execute",
+                    lambda conn, cursor, sql, *a, name=name: selects.__setitem__(
+                        name, selects[name] + ("FROM books" in sql)
+                    ),
+                )
+
+            client = app.test_client()
+            assert all(client.get(f"/books/{book_id}").status_code == 200 for book_id in ids)
+            reads = dict(selects)
+            assert reads["primary"] == 0, "lecturas sin anclar en el primario"
+            assert reads["replica1"] == reads["replica2"] == args.requests // 2
+
+            # Escritura: la respuesta ancla al cliente al primario
+            book_id = client.post(
+                "/books/", json={"title": "Nuevo", "author": "Yo", "pages": 1}
+            ).get_json()["id"]
+            assert client.get(f"/books/{book_id}").status_code == 200
+            assert app.test_client().get(f"/books/{book_id}").status_code == 404
+            time.sleep(app.config["DB_READ_YOUR_WRITES"] + 0.1)
+            assert client.get(f"/books/{book_id}").status_code == 404
+
+            for engine in engines:
+                engine.dispose()
+            results[policy[:5]] = reads
+    print_table(results)
+    print("OK: lecturas en réplicas; tras escribir, el cliente lee del primario")
+
+
+LIST_CHILD = """
+import json, resource, sys, time
+import app_flask
+
+mode, url = sys.argv[1], sys.argv[2]
+app = app_flask.create_app({"DATABASE_URL": url})
+client = app.test_client()
+client.get("/books/?limit=1")  # conexiones y rutas ya calientes
+page = 4096
+base = int(open("/proc/self/statm").read().split()[1]) * page
+start = time.perf_counter()
+if mode == "driver":
+    # Referencia: solo recorrer las filas con el driver, sin Flask ni JSON
+    with app.extensions["books.engine"].connect() as conn:
+        cursor = conn.exec_driver_sql(
+            "SELECT id, title, author, pages FROM books ORDER BY id"
+        ).cursor
+        size, rows = 0, sum(1 for _ in cursor)
+elif mode == "all()":
+    # El `list_books` anterior: instancias ORM, lista de dicts y `jsonify`
+    with app.test_request_context():
+        books = app_flask.get_read_db().query(app_flask.Book).all()
+        body = app_flask.jsonify([app_flask.to_dict(b) for b in books]).data
+        size, rows = len(body), body.count(b'"id"')
+        del books, body
+else:
+    response = client.get(
+        "/books/" + ("?format=ndjson" if mode == "ndjson" else ""), buffered=False
+    )
+    size = rows = 0
+    for chunk in response.response:
+        size += len(chunk)
+        rows += chunk.count(b'"id"')
+    response.close()
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(json.dumps({
+    "rows": rows, "MB": size / 1e6, "s": elapsed,
+    "RSS base MB": base / 1e6, "RSS +peak MB": max(0, peak - base) / 1e6,
+}))
+"""
+
+
+def bench_list(args: argparse.Namespace) -> None:
+    """`GET /books/`: `all()` + `jsonify` frente al streaming (JSON y NDJSON)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        seed_sqlite(db_path, args.rows)
+        results = {}
+        for mode in ("driver", "all()", "json", "ndjson"):
+            out = subprocess.run(
+                [sys.executable, "-c", LIST_CHILD, mode, f"sqlite:///{db_path}"],
+                cwd=HERE, check=True, capture_output=True, text=True,
+            ).stdout
+            results[mode] = json.loads(out.splitlines()[-1])
+            assert results[mode]["rows"] == args.rows, mode
+    print(f"{args.rows:,} libros en SQLite, un proceso por modo "
+          "(driver = solo recorrer el cursor, el suelo de memoria)")
+    print_table(results)
+
+
+def bench_http(args: argparse.Namespace) -> None:
+    """Bytes enviados, latencia y SQL por petición con validadores HTTP y gzip."""
+    from sqlalchemy import event
+
+    from app_flask import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        ids = seed_sqlite(db_path, args.rows)
+        app = create_app({"DATABASE_URL": f"sqlite:///{db_path}"})
+        statements = []
+        event.listen(
+            app.extensions["books.engine"], "before_cursor_execute",
+            lambda conn, cursor, statement, *a: statements.append(statement),
+        )
+        client = app.test_client()
+        plain = client.get("/books/")
+        etag = plain.headers["ETag"]
+        book = client.get(f"/books/{ids[0]}")
+        gzip_headers = {"Accept-Encoding": "gzip"}
+
+        def measure(path: str, headers: dict, status: int, before=lambda: None) -> dict:
+            times, size = [], 0
+            for _ in range(args.repeat):
+                before()
+                statements.clear()
+                start = time.perf_counter()
+                response = client.get(path, headers=headers)
+                size = len(response.data)  # sin descomprimir: lo que viaja
+                times.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == status, (path, response.status)
+            touches_books = any("FROM books" in sql for sql in statements)
+            return {
+                "KB": size / 1024, "ms": statistics.median(times),
+                "SQL": len(statements), "lee books": float(touches_books),
+            }
+
+        cache = app.extensions["books.gzip_cache"]
+        results = {
+            "list": measure("/books/", {}, 200),
+            "list gzip 1ª": measure(
+                "/books/", gzip_headers, 200, before=lambda: cache._entries.clear()
+            ),
+            "list gzip": measure("/books/", gzip_headers, 200),
+            "list 304": measure("/books/", {"If-None-Match": etag, **gzip_headers}, 304),
+            "libro": measure(f"/books/{ids[0]}", {}, 200),
+            "libro 304": measure(
+                f"/books/{ids[0]}", {"If-None-Match": book.headers["ETag"]}, 304
+            ),
+        }
+        assert json.loads(gzip.decompress(client.get("/books/", headers=gzip_headers).data)) \
+            == plain.get_json()
+
+        # Un alta cambia la versión: el ETag anterior deja de valer
+        client.post("/books/", json={"title": "Nuevo", "author": "Yo", "pages": 1})
+        assert client.get("/books/", headers={"If-None-Match": etag}).status_code == 200
+        app.extensions["books.engine"].dispose()
+
+    print(f"{args.rows:,} libros; mediana de {args.repeat} peticiones (SQL = sentencias)")
+    print_table(results)
+    full, packed = results["list"], results["list gzip"]
+    print(f"\ngzip: {full['KB'] / packed['KB']:.1f}x menos bytes; "
+          f"304: {full['ms'] / results['list 304']['ms']:.0f}x más rápido y sin leer `books`")
+
+
+def bench_mget(args: argparse.Namespace) -> None:
+    """N ids: un `POST /books/_mget` frente a N `GET /books/<id>` (tiempo y SQL)."""
+    from sqlalchemy import event
+
+    from app_flask import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        ids = seed_sqlite(db_path, args.rows)
+        app = create_app({"DATABASE_URL": f"sqlite:///{db_path}"})
+        statements = []
+        event.listen(
+            app.extensions["books.engine"], "before_cursor_execute",
+            lambda conn, cursor, statement, *a: statements.append(statement),
+        )
+        client = app.test_client()
+        results = {}
+        for n in args.sizes:
+            batch = ids[:n]
+            body = {"ids": batch + ["0" * 24]}  # con un id inexistente
+
+            def singles() -> list:
+                return [client.get(f"/books/{book_id}").get_json() for book_id in batch]
+
+            def mget() -> list:
+                response = client.post("/books/_mget", json=body)
+                assert response.status_code == 200
+                return response.get_json()["docs"]
+
+            docs = mget()
+            assert docs[:-1] == [
+                {"id": book["id"], "found": True, "book": book} for book in singles()
+            ]
+            assert docs[-1] == {"id": "0" * 24, "found": False}
+            row = {}
+            for name, call in (("N GETs", singles), ("_mget", mget)):
+                runs = []
+                for _ in range(args.repeat):
+                    statements.clear()
+                    start = time.perf_counter()
+                    call()
+                    runs.append((time.perf_counter() - start) * 1000)
+                row[f"{name} ms"] = statistics.median(runs)
+                row[f"{name} SQL"] = len(statements)
+            row["x"] = row["N GETs ms"] / row["_mget ms"]
+            results[f"{n} ids"] = row
+        app.extensions["books.engine"].dispose()
+
+    print(f"{args.rows:,} libros; mediana de {args.repeat} rondas "
+          "(SQL = sentencias por ronda; GET incluye la de la versión para el ETag)")
+    print_table(results)
+
+
+def bench_profile(args: argparse.Namespace) -> None:
+    """µs por petición sin perfilado, instalado sin disparar y perfilando."""
+    from app_flask import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        profiles = Path(tmp) / "profiles"
+        ids = seed_sqlite(db_path, args.rows)
+        base = {"DATABASE_URL": f"sqlite:///{db_path}", "PROFILE_DIR": str(profiles)}
+        setups = {
+            # nombre: (configuración, cabeceras)
+            "apagado": ({}, {}),
+            "instalado": ({"PROFILE_TOKEN": "t"}, {}),
+            "muestreo 1%": ({"PROFILE_SAMPLE_RATE": 0.01}, {}),
+            "sample": ({"PROFILE_TOKEN": "t"}, {"X-Profile": "t"}),
+            "cprofile": ({"PROFILE_TOKEN": "t"}, {"X-Profile": "t", "X-Profile-Mode": "cprofile"}),
+        }
+        paths = {"libro µs": f"/books/{ids[0]}", "página µs": "/books/?limit=100"}
+        apps = {
+            name: create_app({**base, **config, "PROFILE_KEEP": args.keep})
+            for name, (config, _) in setups.items()
+        }
+        times = {(name, column): [] for name in setups for column in paths}
+        # Rondas alternando los casos: el ruido de la máquina se reparte
+        for _ in range(args.rounds):
+            for name, (_, headers) in setups.items():
+                client = apps[name].test_client()
+                for column, path in paths.items():
+                    for _ in range(args.requests // args.rounds):
+                        start = time.perf_counter()
+                        response = client.get(path, headers=headers, buffered=True)
+                        times[name, column].append((time.perf_counter() - start) * 1e6)
+                        assert response.status_code == 200
+        for app in apps.values():
+            app.extensions["books.engine"].dispose()
+        results = {
+            name: {column: statistics.median(times[name, column]) for column in paths}
+            for name in setups
+        }
+
+        # El último perfil (cprofile de una página) y la retención
+        saved = sorted(profiles.glob("*.json"))
+        assert len(saved) <= args.keep, len(saved)
+        last = json.loads(saved[-1].read_text())
+
+    off = results["apagado"]
+    for row in results.values():
+        for column in paths:
+            row[f"+% {column[:-3]}"] = (row[column] / off[column] - 1) * 100
+    print(f"mediana de {args.requests} peticiones por caso (test client, sin red)")
+    print_table(results)
+    print(f"\n{len(saved)} perfiles guardados (PROFILE_KEEP={args.keep}); el último: "
+          f"{last['method']} {last['path']}?{last['query']} {last['duration_ms']:.1f} ms, "
+          f"{last['sql']['count']} SQL en {last['sql']['total_ms']:.2f} ms -> {last['artifact']}")
+
+
+def load_client(port: int, ids: list[str], seconds: float) -> tuple[list[float], int]:
+    """Un cliente keep-alive pidiendo libros al azar; latencias (s) y errores."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    rng = random.Random()
+    latencies, errors = [], 0
+    end = time.perf_counter() + seconds
+    while (start := time.perf_counter()) < end:
+        try:
+            conn.request("GET", f"/books/{rng.choice(ids)}")
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors += 1
+    conn.close()
+    return latencies, errors
+
+
+def worker_pids(master: int) -> set[int]:
+    """Hijos de `master` (Linux)."""
+    with open(f"/proc/{master}/task/{master}/children") as f:
+        return {int(pid) for pid in f.read().split()}
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met")
+        time.sleep(0.05)
+
+
+def responds(port: int) -> bool:
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+        conn.request("GET", "/books/?limit=1")
+        return conn.getresponse().status == 200
+    except OSError:
+        return False
+
+
+def bench_serve(args: argparse.Namespace) -> None:
+    """`serve.py`: peticiones/s según el número de workers, caídas y recarga en caliente."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "books.db"
+        ids = seed_sqlite(db_path, args.rows)
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}"}
+        pool = ProcessPoolExecutor(args.clients, mp_context=multiprocessing.get_context("spawn"))
+
+        def load(port: int, seconds: float) -> list:
+            futures = [pool.submit(load_client, port, ids, seconds) for _ in range(args.clients)]
+            return [future.result() for future in futures]
+
+        results = {}
+        for workers in args.workers:
+            with socket.socket() as probe:  # un puerto libre
+                probe.bind(("127.0.0.1", 0))
+                port = probe.getsockname()[1]
+            server = subprocess.Popen(
+                [sys.executable, "serve.py", "--workers", str(workers),
+                 "--bind", f"127.0.0.1:{port}", "--graceful-timeout", "10"],
+                cwd=HERE, env=env, stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_for(lambda: responds(port) and len(worker_pids(server.pid)) == workers)
+                load(port, 0.5)  # calentar clientes y conexiones
+                clients = load(port, args.seconds)
+                latencies = sorted(x for client, _ in clients for x in client)
+                results[f"{workers} workers"] = {
+                    "req/s": len(latencies) / args.seconds,
+                    "p50 ms": latencies[len(latencies) // 2] * 1000,
+                    "p99 ms": latencies[int(0.99 * len(latencies))] * 1000,
+                    "errors": sum(errors for _, errors in clients),
+                }
+
+                if workers == args.workers[-1]:
+                    # Un worker muere: el maestro lo sustituye
+                    before = worker_pids(server.pid)
+                    victim = min(before)
+                    os.kill(victim, signal.SIGKILL)
+                    wait_for(lambda: victim not in (pids := worker_pids(server.pid))
+                             and len(pids) == workers)
+                    assert responds(port)
+
+                    # Recarga con carga: ni un error y todos los workers son nuevos
+                    before = worker_pids(server.pid)
+                    futures = [
+                        pool.submit(load_client, port, ids, args.seconds)
+                        for _ in range(args.clients)
+                    ]
+                    time.sleep(args.seconds / 3)
+                    server.send_signal(signal.SIGHUP)
+                    reload_clients = [future.result() for future in futures]
+                    wait_for(lambda: (pids := worker_pids(server.pid)).isdisjoint(before)
+                             and len(pids) == workers)
+                    served = sum(len(client) for client, _ in reload_clients)
+                    failed = sum(errors for _, errors in reload_clients)
+                    assert failed == 0, f"{failed} errores durante la recarga"
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=30)
+        pool.shutdown()
+
+    print(f"{args.clients} clientes keep-alive, {args.seconds:.0f} s por configuración, "
+          f"{os.cpu_count()} CPU (los clientes compiten con el servidor por ellas)\n")
+    print_table(results)
+    print(f"\ncaída de un worker: sustituido; recarga (SIGHUP) con carga: "
+          f"{served:,} peticiones, 0 errores, todos los workers nuevos")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("startup", help=bench_startup.__doc__)
+    p.add_argument("--runs", type=int, default=5)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("replicas", help=check_replicas.__doc__)
+    p.add_argument("--requests", type=int, default=200)
+    p.set_defaults(func=check_replicas)
+
+    p = sub.add_parser("list", help=bench_list.__doc__)
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.set_defaults(func=bench_list)
+
+    p = sub.add_parser("http", help=bench_http.__doc__)
+    p.add_argument("--rows", type=int, default=100_000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_http)
+
+    p = sub.add_parser("serve", help=bench_serve.__doc__)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--clients", type=int, default=16)
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--rows", type=int, default=10_000)
+    p.set_defaults(func=bench_serve)
+
+    p = sub.add_parser("mget", help=bench_mget.__doc__)
+    p.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 500])
+    p.add_argument("--rows", type=int, default=10_000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_mget)
+
+    p = sub.add_parser("profile", help=bench_profile.__doc__)
+    p.add_argument("--requests", type=int, default=1000)
+    p.add_argument("--rounds", type=int, default=10)
+    p.add_argument("--rows", type=int, default=10_000)
+    p.add_argument("--keep", type=int, default=20)
+    p.set_defaults(func=bench_profile)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Perfilado bajo demanda de peticiones (`app_flask.py`)
+=====================================================
+
+Apagado por defecto y, así, sin coste alguno: `create_app` solo instala el
+middleware y los eventos del motor si hay `PROFILE_TOKEN` o
+`PROFILE_SAMPLE_RATE > 0`.
+
+    PROFILE_TOKEN=...               perfilar las peticiones con la cabecera
+                                    `X-Profile: <token>` (y descargar perfiles)
+    PROFILE_SAMPLE_RATE=0.001       perfilar además una de cada mil peticiones
+    PROFILE_MODE=sample             `sample` o `cprofile` (`X-Profile-Mode`
+                                    lo elige por petición)
+    PROFILE_INTERVAL_MS=1           intervalo de muestreo
+    PROFILE_DIR                     por defecto, <tmp>/books-profiles
+    PROFILE_KEEP=100, PROFILE_MAX_MB=50    retención: se borran los más antiguos
+
+Una petición perfilada responde con `X-Profile-Id: <id>` y deja en
+`PROFILE_DIR`:
+
+*  `<id>.json`: método, ruta, estado, duración y las sentencias SQL con su
+   tiempo, también agrupadas por texto para ver de un vistazo un N+1.
+*  `<id>.collapsed` (modo `sample`): pilas del hilo de la petición tomadas
+   cada `PROFILE_INTERVAL_MS`, en formato *collapsed* (`flamegraph.pl`,
+   speedscope). Con el GIL, mientras la petición usa CPU el muestreador
+   solo entra cada `sys.getswitchinterval()` (5 ms).
+*  `<id>.pstats` (modo `cprofile`): `python -m pstats`, snakeviz...
+
+Con el token, `GET /_profiles/` lista los perfiles (el `.json` de cada uno)
+y `GET /_profiles/<fichero>` lo descarga.
+
+El middleware envuelve la app WSGI y no usa `before/after_request`: el
+perfil cubre también el envío del cuerpo, que en `GET /books/` (streaming)
+es donde se leen las filas y se serializan.
+
+Los tiempos SQL salen de `before/after_cursor_execute` en la conexión de
+cada sesión que se abre durante una petición perfilada (`after_begin` del
+`sessionmaker`), no en el motor: un solo listener en el motor hace que
+todas las sentencias pasen por el camino con eventos (~40 µs más cada una
+en SQLite) aunque nadie esté perfilando.
+
+Un perfil a la vez por proceso; una petición que llega mientras otra se
+perfila se sirve sin perfilar. cProfile (3.12+) solo admite un perfilador
+activo por proceso y mide todos los hilos: con tráfico concurrente su perfil
+incluye otras peticiones. El modo `sample` mira solo el hilo de la petición.
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from flask import Blueprint, Flask, abort, current_app, jsonify, request, send_from_directory
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from werkzeug.wsgi import ClosingIterator
+
+PROFILE_HEADER = "X-Profile"
+MODES = ("sample", "cprofile")
+MAX_SQL_STATEMENTS = 1000  # sentencias detalladas por perfil; el resto solo suma
+ARTIFACT = re.compile(r"\d{8}T\d{9}-[0-9a-f]{8}\.(json|collapsed|pstats)")
+
+# La petición en perfilado del hilo actual (el servidor WSGI atiende cada
+# petición, cuerpo incluido, en un mismo hilo)
+_local = threading.local()
+
+
+class Recording:
+    """Una petición en perfilado: su perfilador y sus sentencias SQL."""
+
+    def __init__(self, mode: str, interval: float) -> None:
+        self.started_at = now = time.time()
+        # Empieza por la fecha (con milisegundos): ordenar ids es ordenar por antigüedad
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(now))
+        self.id = f"{stamp}{int(now % 1 * 1000):03d}-{secrets.token_hex(4)}"
+        self.mode = mode
+        self.statements: list[tuple[float, str]] = []  # (segundos, SQL)
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self._start = time.perf_counter()
+        self.elapsed = 0.0
+        if mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._stacks: Counter[str] = Counter()
+            self._labels: dict[Any, str] = {}
+            self._thread = threading.get_ident()
+            self._stop = threading.Event()
+            self._sampler = threading.Thread(
+                target=self._sample, args=(interval,), name="books-profiler", daemon=True
+            )
+            self._sampler.start()
+
+    def _sample(self, interval: float) -> None:
+        labels = self._labels
+        while not self._stop.wait(interval):
+            frame = sys._current_frames().get(self._thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = (
+                        f"{code.co_qualname} ({os.path.basename(code.co_filename)}"
+                        f":{code.co_firstlineno})"
+                    )
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self._stacks[";".join(reversed(stack))] += 1
+
+    def add_sql(self, statement: str, seconds: float) -> None:
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        if len(self.statements) < MAX_SQL_STATEMENTS:
+            self.statements.append((seconds, statement))
+
+    def stop(self) -> None:
+        self.elapsed = time.perf_counter() - self._start
+        if self.mode == "cprofile":
+            self._profiler.disable()
+        else:
+            self._stop.set()
+            self._sampler.join()
+
+    def save(self, directory: Path, details: dict[str, Any]) -> None:
+        """Escribe el perfil y su `.json`; el `.json` al final (lo que lista `/_profiles/`)."""
+        if self.mode == "cprofile":
+            artifact = f"{self.id}.pstats"
+            self._profiler.dump_stats(directory / artifact)
+        else:
+            artifact = f"{self.id}.collapsed"
+            (directory / artifact).write_text(
+                "".join(f"{stack} {count}\n" for stack, count in self._stacks.items())
+            )
+        by_text: dict[str, list[float]] = {}
+        for seconds, statement in self.statements:
+            by_text.setdefault(statement, []).append(seconds)
+        summary = {
+            "id": self.id,
+            "mode": self.mode,
+            "artifact": artifact,
+            "started_at": self.started_at,
+            **details,
+            "duration_ms": self.elapsed * 1000,
+            "samples": sum(self._stacks.values()) if self.mode == "sample" else None,
+            "sql": {
+                "count": self.sql_count,
+                "total_ms": self.sql_seconds * 1000,
+                "statements": [
+                    {"ms": seconds * 1000, "sql": statement}
+                    for seconds, statement in self.statements
+                ],
+                "by_statement": sorted(
+                    (
+                        {"count": len(times), "total_ms": sum(times) * 1000, "sql": statement}
+                        for statement, times in by_text.items()
+                    ),
+                    key=lambda entry: -entry["total_ms"],
+                ),
+            },
+        }
+        (directory / f"{self.id}.json").write_text(json.dumps(summary, indent=1))
+
+
+def prune(directory: Path, keep: int, max_bytes: int) -> None:
+    """Borra los perfiles más antiguos hasta dejar como mucho `keep` y `max_bytes`."""
+    profiles: dict[str, list[tuple[Path, int]]] = {}
+    for path in directory.iterdir():
+        if ARTIFACT.fullmatch(path.name):
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:  # otro worker lo acaba de borrar
+                continue
+            profiles.setdefault(path.name.partition(".")[0], []).append((path, size))
+    ids = sorted(profiles)  # el id empieza por la fecha
+    total = sum(size for files in profiles.values() for _, size in files)
+    while ids and (len(ids) > keep or total > max_bytes):
+        for path, size in profiles[ids.pop(0)]:
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+class ProfilingMiddleware:
+    """Middleware WSGI que perfila las peticiones con token o las del muestreo."""
+
+    def __init__(self, wsgi_app: Callable, app: Flask) -> None:
+        config = app.config
+        self.wsgi_app = wsgi_app
+        self.logger = app.logger
+        self.token = config["PROFILE_TOKEN"].encode()
+        self.rate = config["PROFILE_SAMPLE_RATE"]
+        self.mode = config["PROFILE_MODE"]
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown profile mode: {self.mode!r}")
+        self.interval = config["PROFILE_INTERVAL_MS"] / 1000
+        self.directory = Path(config["PROFILE_DIR"])
+        self.keep = config["PROFILE_KEEP"]
+        self.max_bytes = int(config["PROFILE_MAX_MB"] * 2**20)
+        self._busy = threading.Lock()
+
+    def wanted(self, environ: dict) -> str | None:
+        """Modo en que perfilar la petición, o `None`."""
+        if environ.get("PATH_INFO", "").startswith("/_profiles/"):
+            return None
+        token = environ.get("HTTP_X_PROFILE")
+        if token is not None and token_matches(token, self.token):
+            mode = environ.get("HTTP_X_PROFILE_MODE", self.mode)
+            return mode if mode in MODES else self.mode
+        if self.rate > 0 and random.random() < self.rate:
+            return self.mode
+        return None
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        mode = self.wanted(environ)
+        if mode is None or not self._busy.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+
+        try:
+            recording = Recording(mode, self.interval)
+        except ValueError:  # cProfile: ya hay otro perfilador (p. ej. un depurador)
+            self._busy.release()
+            return self.wsgi_app(environ, start_response)
+        _local.recording = recording
+        status = [500]
+
+        def start_profiled(status_line: str, headers: list, exc_info: Any = None):
+            status[0] = int(status_line.split(" ", 1)[0])
+            return start_response(status_line, [*headers, ("X-Profile-Id", recording.id)], exc_info)
+
+        def finish() -> None:
+            recording.stop()
+            _local.recording = None
+            self._busy.release()
+            details = {
+                "method": environ.get("REQUEST_METHOD"),
+                "path": environ.get("PATH_INFO"),
+                "query": environ.get("QUERY_STRING", ""),
+                "status": status[0],
+            }
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                recording.save(self.directory, details)
+                prune(self.directory, self.keep, self.max_bytes)
+            except OSError:
+                self.logger.exception("could not store profile %s", recording.id)
+
+        try:
+            body = self.wsgi_app(environ, start_profiled)
+        except BaseException:
+            finish()
+            raise
+        # El perfil termina cuando el servidor cierra la respuesta ya enviada
+        return ClosingIterator(body, finish)
+
+
+def token_matches(given: str, token: bytes) -> bool:
+    return bool(token) and secrets.compare_digest(given.encode(), token)
+
+
+# --- Tiempos SQL (solo en las conexiones de una petición en perfilado) ---
+
+def _after_begin(session, transaction, connection) -> None:
+    if getattr(_local, "recording", None) is not None:
+        event.listen(connection, "before_cursor_execute", _before_cursor_execute)
+        event.listen(connection, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.books_profile_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    recording = getattr(_local, "recording", None)
+    start = getattr(context, "books_profile_start", None)
+    if recording is not None and start is not None:
+        recording.add_sql(statement, time.perf_counter() - start)
+
+
+def instrument_sessions(factory: sessionmaker) -> None:
+    event.listen(factory, "after_begin", _after_begin)
+
+
+# --- Descarga ---
+
+bp = Blueprint("profiles", __name__, url_prefix="/_profiles")
+
+
+@bp.before_request
+def require_token():
+    token = current_app.config["PROFILE_TOKEN"].encode()
+    if not token_matches(request.headers.get(PROFILE_HEADER, ""), token):
+        abort(404)  # sin token, como si no existiera
+
+
+@bp.get("/")
+def list_profiles():
+    """Los perfiles guardados, del más reciente al más antiguo."""
+    directory = Path(current_app.config["PROFILE_DIR"])
+    profiles = []
+    for path in sorted(directory.glob("*.json"), reverse=True):
+        if ARTIFACT.fullmatch(path.name):
+            try:
+                summary = json.loads(path.read_text())
+            except (FileNotFoundError, ValueError):  # borrado o a medio escribir
+                continue
+            summary["sql"].pop("statements")
+            profiles.append(summary)
+    return jsonify(profiles)
+
+
+@bp.get("/<name>")
+def download_profile(name: str):
+    if not ARTIFACT.fullmatch(name):
+        abort(404)
+    return send_from_directory(current_app.config["PROFILE_DIR"], name, as_attachment=True)
+
+
+def init_app(app: Flask) -> None:
+    """Instala el perfilado si la configuración lo pide; si no, no toca nada."""
+    if not app.config["PROFILE_TOKEN"] and app.config["PROFILE_SAMPLE_RATE"] <= 0:
+        return
+    instrument_sessions(app.extensions["books.sessionmaker"])
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, app)
+    app.register_blueprint(bp)
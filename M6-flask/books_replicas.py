@@ -0,0 +1 @@
+../M6-fastapi/books_replicas.py
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""
+Lanzador pre-fork del servicio de libros (`app_flask.py`)
+=========================================================
+
+    python serve.py --workers 4 --bind 0.0.0.0:5000
+
+El maestro crea la app una sola vez (`create_app()`: configuración,
+motores, `create_all`), abre el socket de escucha y hace *fork* de N
+workers. Todos aceptan conexiones del mismo socket (el kernel las reparte)
+y sirven con el servidor WSGI de Werkzeug, un hilo por conexión.
+
+*  Pool de conexiones: el maestro cierra las suyas antes del fork y cada
+   worker descarta el pool heredado (`engine.dispose(close=False)`), así
+   que ninguna conexión de BD se comparte entre procesos; cada worker abre
+   las suyas al usarlas.
+*  Un worker que muere se sustituye. Si muere nada más arrancar, el
+   siguiente intento espera cada vez más (hasta `MAX_RESPAWN_DELAY`).
+*  `SIGHUP`: recarga sin cortar el servicio. Se comprueba en un proceso
+   aparte que la app nueva arranca; si es así el maestro se re-ejecuta
+   (código y entorno nuevos) conservando el socket, arranca los workers
+   nuevos y pide a los viejos que terminen. Si no, sigue como estaba.
+*  `SIGTERM` / `SIGINT`: parada ordenada. Los workers dejan de aceptar,
+   terminan las peticiones en curso y, pasado `--graceful-timeout`, se
+   matan.
+
+Solo POSIX (usa `fork`).
+
+---------------------
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import NoReturn
+
+from flask import Flask
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app_flask import create_app
+
+LISTEN_FD_ENV = "BOOKS_LISTEN_FD"  # socket heredado tras una recarga
+OLD_WORKERS_ENV = "BOOKS_OLD_WORKERS"  # pids de la generación anterior
+KEEPALIVE_SECONDS = 5.0
+MIN_WORKER_LIFETIME = 1.0  # morir antes cuenta como fallo de arranque
+MAX_RESPAWN_DELAY = 10.0
+
+log = logging.getLogger("serve")
+
+
+class Handler(WSGIRequestHandler):
+    # Una conexión keep-alive ociosa no retiene su hilo (ni la parada) más de esto
+    timeout = KEEPALIVE_SECONDS
+
+    def end_headers(self) -> None:
+        # Parando: cada respuesta cierra su conexión keep-alive, y el cliente
+        # lo sabe y reconecta (a otro worker) en lugar de encontrarla cortada
+        if self.server.stopping:
+            self.send_header("Connection", "close")
+        super().end_headers()
+
+
+def listen_socket(host: str, port: int, backlog: int) -> socket.socket:
+    """El socket heredado de la generación anterior o uno nuevo."""
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is not None:
+        sock = socket.socket(fileno=int(fd))
+    else:
+        sock = socket.create_server((host, port), backlog=backlog)
+    sock.set_inheritable(True)  # sobrevive a `execv` en la recarga
+    return sock
+
+
+def run_worker(app: Flask, sock: socket.socket) -> NoReturn:
+    """Cuerpo de un worker tras el fork; nunca vuelve."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C: decide el maestro
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    for engine in app.extensions["books.router"].engines:
+        engine.dispose(close=False)  # las conexiones heredadas no son de este proceso
+
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, request_handler=Handler, fd=sock.fileno())
+    sock.close()  # `make_server` trabaja con su propio duplicado
+    server.daemon_threads = False  # `server_close` espera a las peticiones en curso
+    server.stopping = False
+
+    def stop(signum: int, frame: object) -> None:
+        server.stopping = True
+        # `shutdown` espera a que salga `serve_forever`: desde otro hilo
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except BaseException:
+        log.exception("worker %d failed", os.getpid())
+        os._exit(1)
+    os._exit(0)
+
+
+class Arbiter:
+    """Mantiene `workers` procesos vivos y atiende las señales del maestro."""
+
+    def __init__(self, app: Flask, sock: socket.socket, args: argparse.Namespace) -> None:
+        self.app = app
+        self.sock = sock
+        self.args = args
+        self.workers: dict[int, float] = {}  # pid -> instante de arranque
+        self.retiring: dict[int, float] = {}  # pid -> plazo para terminar
+        self.failures = 0
+        self.next_spawn = 0.0
+        self.signals: list[int] = []
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.app, self.sock)
+            finally:
+                os._exit(1)
+        self.workers[pid] = time.monotonic()
+        log.info("worker %d started", pid)
+
+    def retire(self, pids: list[int]) -> None:
+        """Pide a `pids` que terminen; se matan si no lo hacen a tiempo."""
+        deadline = time.monotonic() + self.args.graceful_timeout
+        for pid in pids:
+            self.workers.pop(pid, None)
+            self.retiring[pid] = deadline
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.retiring.pop(pid)
+
+    def reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self.retiring.pop(pid, None) is not None:
+                continue
+            started = self.workers.pop(pid, None)
+            if started is None or self.stopping:
+                continue
+            log.warning("worker %d died (%s), replacing it", pid, describe(status))
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                self.failures += 1
+                delay = min(MAX_RESPAWN_DELAY, 0.1 * 2**self.failures)
+                self.next_spawn = time.monotonic() + delay
+            else:
+                self.failures = 0
+
+    def kill_overdue(self) -> None:
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if now > deadline:
+                log.warning("worker %d did not stop in time, killing it", pid)
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    self.retiring.pop(pid)
+
+    def run(self) -> None:
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+        old = [int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, "").split(",") if pid]
+        for _ in range(self.args.workers):
+            self.spawn()
+        if old:
+            log.info("reloaded; stopping previous workers %s", old)
+            self.retire(old)
+
+        while not (self.stopping and not self.workers and not self.retiring):
+            self.reap()
+            self.kill_overdue()
+            while self.signals:
+                signum = self.signals.pop(0)
+                if signum == signal.SIGHUP and not self.stopping:
+                    self.reload()
+                elif signum in (signal.SIGTERM, signal.SIGINT) and not self.stopping:
+                    log.info("stopping (%s)", signal.Signals(signum).name)
+                    self.stopping = True
+                    self.retire(list(self.workers))
+            if (
+                not self.stopping
+                and len(self.workers) < self.args.workers
+                and time.monotonic() >= self.next_spawn
+            ):
+                self.spawn()
+            time.sleep(0.05)
+        log.info("stopped")
+
+    def reload(self) -> None:
+        """Re-ejecuta el maestro con el código actual si la app nueva arranca."""
+        check = subprocess.run([sys.executable, *sys.orig_argv[1:], "--check"])
+        if check.returncode != 0:
+            log.error("reload aborted: the new app does not start (exit %d)", check.returncode)
+            return
+        log.info("reloading")
+        os.environ[LISTEN_FD_ENV] = str(self.sock.fileno())
+        os.environ[OLD_WORKERS_ENV] = ",".join(map(str, [*self.workers, *self.retiring]))
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.execv(sys.executable, sys.orig_argv)
+
+
+def describe(status: int) -> str:
+    if os.WIFSIGNALED(status):
+        return signal.Signals(os.WTERMSIG(status)).name
+    return f"exit {os.waitstatus_to_exitcode(status)}"
+
+
+def parse_bind(value: str) -> tuple[str, int]:
+    host, _, port = value.rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--bind", type=parse_bind, default=("0.0.0.0", 5000), help="host:port")
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    )
+    parser.add_argument("--backlog", type=int, default=1024)
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    parser.add_argument("--access-log", action="store_true", help="una línea por petición")
+    parser.add_argument("--check", action="store_true", help="solo comprobar que la app arranca")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="[serve %(process)d] %(message)s")
+    if not args.access_log:
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    app = create_app()
+    if args.check:
+        return
+    for engine in app.extensions["books.router"].engines:
+        engine.dispose()  # sin conexiones abiertas que heredar
+    sock = listen_socket(*args.bind, args.backlog)
+    log.info("listening on %s:%d with %d workers", *sock.getsockname()[:2], args.workers)
+    Arbiter(app, sock, args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -21,9 +21,30 @@ CREATE TABLE books (
     id     CHAR(24)      PRIMARY KEY,
     title  VARCHAR(255)  NOT NULL,
     author VARCHAR(255)  NOT NULL,
-    pages  INT           NOT NULL DEFAULT 0
+    pages  INT           NOT NULL DEFAULT 0,
+    INDEX ix_books_author_id (author, id),
+    INDEX ix_books_title_id  (title, id),
+    INDEX ix_books_pages_id  (pages, id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+/* Versión de cada tabla cacheable (ETag / Last-Modified de la app Flask).
+   El trigger la sube con cada alta en `books`, venga de la app que venga */
+DROP TABLE IF EXISTS table_versions;
+
+CREATE TABLE table_versions (
+    name       VARCHAR(64)  PRIMARY KEY,
+    version    INT          NOT NULL,
+    changed_at DOUBLE       NOT NULL COMMENT 'Unix time de la última escritura'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT INTO table_versions (name, version, changed_at)
+VALUES ('books', 0, UNIX_TIMESTAMP(NOW(6)));
+
+CREATE TRIGGER books_version AFTER INSERT ON books FOR EACH ROW
+    INSERT INTO table_versions (name, version, changed_at)
+    VALUES ('books', 1, UNIX_TIMESTAMP(NOW(6)))
+    ON DUPLICATE KEY UPDATE version = version + 1, changed_at = VALUES(changed_at);
+
 /* 3. Semilla opcional */
 INSERT INTO books (id, title, author, pages) VALUES
   (LPAD(HEX(RANDOM_BYTES(12)),24,'0'), 'Clean Code',               'Robert C. Martin',      464),